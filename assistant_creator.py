@@ -28,10 +28,9 @@ class CustomController:
 
 	def step(self):
     	# Example implementation, to be replaced with custom behavior.
-    	ego = self.state.vehicles[0]
-    	otherCar = self.state.vehicles[1]
+    	gap = self.state.gap_to_leader()
 
-    	if ego.lane_id == otherCar.lane_id and ego.s > otherCar.s - 50:
+    	if gap is not None and gap < 50:
         	self.state.set_speed(0.0)
 ```
 
@@ -61,6 +60,32 @@ class State:
 	def set_offset(self, offset):
     	# Adjusts the ego car's lateral position within the lane. Ranges from -0.6 to 0.6, with 2.8 exiting the lane.
     	...
+
+	# Neighbour queries. vehicle_number is the index in self.vehicles (0 is the ego car). Ahead means a greater s.
+	# Without lane_id the vehicle's own lane is used, otherwise the given lane, e.g. ego.lane_id + 1 for the lane to the left.
+	def vehicles_in_lane(self, lane_id):
+    	# The vehicles in a lane, sorted by s.
+    	...
+
+	def leader(self, vehicle_number=0, lane_id=None):
+    	# The closest vehicle ahead. None if there is none.
+    	...
+
+	def follower(self, vehicle_number=0, lane_id=None):
+    	# The closest vehicle behind. None if there is none.
+    	...
+
+	def gap_to_leader(self, vehicle_number=0, lane_id=None):
+    	# Distance in meters along the road to the leader. None if there is no leader.
+    	...
+
+	def gap_to_follower(self, vehicle_number=0, lane_id=None):
+    	# Distance in meters along the road to the follower. None if there is no follower.
+    	...
+
+	def time_to_collision(self, vehicle_number=0, lane_id=None):
+    	# Seconds until the vehicle reaches its leader at the current speeds. None if there is no leader, math.inf if it is not faster than the leader.
+    	...
 ```
 
 ### Vehicle Class:
@@ -79,15 +104,19 @@ class Vehicle:
     	self.heading = heading # The direction of travel for the vehicle compared to an absolute North. Radians float.
 ```
 
+The vehicles in `state.vehicles` are updated in place on every step. To remember the values of a vehicle from an earlier step, store `vehicle.snapshot()`, which returns a copy that does not change.
+
 #### Implementing the `step` Method:
 
 - The `step` method is invoked at each simulation step to decide the next actions for the vehicle based on the current state.
 - Utilize the attributes and methods of the `State` class to implement the desired vehicle behavior.
 - The state object will be updated before each call to `step`.
+- Actions are carried out when `step` returns. If an action is called several times in one step, only the last call counts (the first one for `switch_lane`), and repeating an unchanged action in later steps has no effect.
 
 #### Utility Functions:
 
-- You may implement additional utility functions within your `CustomController` class for tasks such as filtering vehicles in the same lane or calculating the time until impact based on current distances and relative velocities.
+- Use the neighbour queries of the `State` class to find the vehicles ahead and behind in a lane and the gaps and times to collision, instead of looping over `state.vehicles`. The distances match the ones used by the checks in the feedback.
+- You may implement additional utility functions within your `CustomController` class for other tasks.
 
 #### Integration with Simulation:
 
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import svala
+import evaluation_suites
+
+"""Runs several evaluation suites, or repetitions of one, in a single process and writes one index of the resulting run folders.
+The suites run in threads. Controller generations and scenario sets take turns on separate limits, so that one suite can wait
+for the language model while another uses the simulator. Each suite keeps its controller in its own run folder."""
+
+# Folder of the run folders and of the batch indexes, relative to the directory Svala is started from
+RUNS_FOLDER = "runs"
+
+# Default number of suites in progress at the same time
+CONCURRENCY = 4
+
+
+# Runs each suite the given number of times, at most concurrency at a time, and returns the path of the batch index.
+# llm_concurrency limits the controller generations at the same time (default: no limit besides concurrency),
+# simulation_concurrency the scenario sets simulated at the same time.
+def run_batch(suites, concurrency=CONCURRENCY, repetitions=1, llm_concurrency=None, simulation_concurrency=1):
+    # The backend is set for the whole process, so all suites of a batch have to use the same one
+    backends = {json.dumps(suite.get('llm_backend', None), sort_keys=True) for suite in suites}
+    if len(backends) > 1:
+        raise ValueError("The suites of a batch must use the same llm_backend")
+
+    jobs = [(suite, repetition) for suite in suites for repetition in range(repetitions)]
+    svala.llm_slots = threading.BoundedSemaphore(llm_concurrency) if llm_concurrency else None
+    svala.simulation_slots = threading.BoundedSemaphore(simulation_concurrency) if simulation_concurrency else None
+    started = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            entries = list(executor.map(lambda job: run_job(*job[1], session=str(job[0])), enumerate(jobs)))
+    finally:
+        svala.llm_slots = None
+        svala.simulation_slots = None
+
+    index = {
+        "started": started,
+        "concurrency": concurrency,
+        "llm_concurrency": llm_concurrency,
+        "simulation_concurrency": simulation_concurrency,
+        "wall_time_s": round(time.perf_counter() - start, 1),
+        "runs": entries
+    }
+    return save_index(index)
+
+# Runs one suite and summarizes its run folder. A failing suite is recorded in the index without stopping the others.
+# The session, the number of the job in the batch, is the same when the batch is replayed.
+def run_job(suite, repetition, session=None):
+    start = time.perf_counter()
+    entry = {"task": suite['task'], "repetition": repetition, "run_path": None, "exception": None}
+    try:
+        entry["run_path"] = svala.main(suite, isolated=True, session=session)
+    except Exception as e:
+        traceback.print_exc()
+        entry["exception"] = repr(e)
+    entry["wall_time_s"] = round(time.perf_counter() - start, 1)
+    entry.update(summarize_run(entry["run_path"]))
+    return entry
+
+# The results of the last iteration of a run folder, read from its evaluation data
+def summarize_run(run_path):
+    evaluation_path = os.path.join(run_path, "evaluation_data.json") if run_path else None
+    if evaluation_path is None or not os.path.exists(evaluation_path):
+        return {"iterations": None, "passed": False}
+    with open(evaluation_path) as file:
+        iterations = json.load(file)["iterations"]
+    final = iterations[-1]
+    return {
+        "iterations": len(iterations) - 1,
+        "success": final["run_success"],
+        "fail": final["run_fail"],
+        "error": final["run_error"],
+        "timeout": final["run_timeout"],
+        "passed": final["run_fail"] == 0 and final["run_error"] == 0 and final["run_timeout"] == 0
+    }
+
+def save_index(index, runs_folder=RUNS_FOLDER):
+    os.makedirs(runs_folder, exist_ok=True)
+    index_path = os.path.join(runs_folder, f"batch_{index['started']}.json")
+    number = 1
+    while os.path.exists(index_path):
+        number += 1
+        index_path = os.path.join(runs_folder, f"batch_{index['started']}_{number}.json")
+    with open(index_path, "w") as file:
+        json.dump(index, file, indent=2)
+    return index_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs several evaluation suites of evaluation_suites.py and indexes their run folders")
+    parser.add_argument("suites", nargs="+", help="Names of the suites in evaluation_suites.py, e.g. test_evaluation_suite")
+    parser.add_argument("--repetitions", type=int, default=1, help="Number of runs of each suite")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Suites in progress at the same time")
+    parser.add_argument("--llm-slots", type=int, default=None, help="Controller generations at the same time (default: no limit)")
+    parser.add_argument("--simulation-slots", type=int, default=1, help="Scenario sets simulated at the same time")
+    arguments = parser.parse_args()
+    suites = [getattr(evaluation_suites, name) for name in arguments.suites]
+    index_path = run_batch(suites, arguments.concurrency, arguments.repetitions, arguments.llm_slots, arguments.simulation_slots)
+    print(f"Batch index saved to {index_path}")
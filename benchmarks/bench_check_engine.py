@@ -0,0 +1,40 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import report_gen_log
+from synthetic_log import create_log
+
+"""Compares running many checks with one shared plan of derived quantities against every check deriving its own."""
+
+def main():
+    df = create_log(20, number_of_frames=300, seed=1)
+
+    print(f"{'checks':>6} {'separately [ms]':>16} {'shared plan [ms]':>17}")
+    for number_of_checks in (1, 6, 12, 24):
+        # A mix of distance and time to collision checks with different limits
+        checks = []
+        for i in range(number_of_checks):
+            if i % 2 == 0:
+                checks.append(report_gen_log.closest_distance_to_any_vehicle(5 + i))
+            else:
+                checks.append(report_gen_log.min_time_to_collision(1 + i / 10))
+
+        def run_separately():
+            return [check(df) for check in checks]
+
+        def run_shared():
+            derived = report_gen_log.execute_plan(df, report_gen_log.build_plan(checks))
+            return [check(df, derived) for check in checks]
+
+        assert run_separately() == run_shared()
+
+        repetitions = 20
+        separate_time = timeit.timeit(run_separately, number=repetitions) / repetitions
+        shared_time = timeit.timeit(run_shared, number=repetitions) / repetitions
+        print(f"{number_of_checks:>6} {separate_time * 1000:>16.2f} {shared_time * 1000:>17.2f}")
+
+if __name__ == "__main__":
+    main()
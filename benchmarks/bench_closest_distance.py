@@ -0,0 +1,55 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import report_gen_log
+from synthetic_log import create_log
+
+"""Compares the vectorized closest_distance_to_any_vehicle check with the previous row by row implementation."""
+
+# The previous implementation, which applies calculate_distance to every row once per vehicle
+def closest_distance_row_by_row(min_allowed_distance):
+    def check(df):
+        vehicle_ids = report_gen_log.get_vehicle_identifiers(df)
+        closest_distance = float('inf')
+        closest_time = None
+        closest_vehicle_id = None
+
+        for vid in vehicle_ids[1:]:
+            prefix = f"#{vid}"
+            distances = df.apply(lambda row: report_gen_log.calculate_distance(row, prefix), axis=1)
+            min_distance_index = distances.idxmin()
+            if distances[min_distance_index] < closest_distance:
+                closest_distance = distances[min_distance_index]
+                closest_time = df.loc[min_distance_index, "TimeStamp [s]"]
+                closest_vehicle_id = vid
+
+        if closest_distance == float('inf'):
+            return (True, "No other vehicles present or no distances calculated.")
+
+        if closest_distance < min_allowed_distance:
+            return (False, f"Closest distance Ego comes to any vehicle is {closest_distance:.2f} m to vehicle #{closest_vehicle_id} at time: {closest_time} s, which is closer than the allowed minimum of {min_allowed_distance} m.")
+        else:
+            return (True, f"Closest distance Ego comes to any vehicle is {closest_distance:.2f} m to vehicle #{closest_vehicle_id} at time: {closest_time} s, respecting the minimum allowed distance of {min_allowed_distance} m.")
+    return check
+
+def main():
+    row_by_row = closest_distance_row_by_row(7)
+    vectorized = report_gen_log.closest_distance_to_any_vehicle(7)
+
+    print(f"{'vehicles':>8} {'frames':>6} {'row by row [ms]':>16} {'vectorized [ms]':>16} {'speedup':>8}")
+    for number_of_vehicles in (2, 5, 10, 20, 40):
+        df = create_log(number_of_vehicles, number_of_frames=300, seed=number_of_vehicles)
+
+        # Both implementations have to produce the same report
+        assert row_by_row(df) == vectorized(df), (row_by_row(df), vectorized(df))
+
+        repetitions = 3
+        row_by_row_time = timeit.timeit(lambda: row_by_row(df), number=repetitions) / repetitions
+        vectorized_time = timeit.timeit(lambda: vectorized(df), number=repetitions * 10) / (repetitions * 10)
+        print(f"{number_of_vehicles:>8} {len(df):>6} {row_by_row_time * 1000:>16.2f} {vectorized_time * 1000:>16.2f} {row_by_row_time / vectorized_time:>7.0f}x")
+
+if __name__ == "__main__":
+    main()
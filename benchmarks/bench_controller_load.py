@@ -0,0 +1,44 @@
+import importlib
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import controller_loader
+
+"""Compares loading the controller for each scenario by reloading the custom_controller module from its file
+with loading it from source through controller_loader, which compiles each version once."""
+
+def main():
+    controller_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_controller.py")
+    source = controller_loader.read_controller(controller_file)
+    # A longer controller, like the generated ones with their planning comments and helper methods
+    long_source = source + "".join(f"\n\ndef helper_{index}(state):\n    gap = state.gap_to_leader()\n    return gap is not None and gap < {index}\n" for index in range(200))
+
+    print(f"{'controller':>12} {'reload [ms]':>12} {'loader [ms]':>12}")
+    with tempfile.TemporaryDirectory() as folder:
+        sys.path.insert(0, folder)
+        # No bytecode cache is written, as the file is rewritten by every generation in a real run
+        sys.dont_write_bytecode = True
+        for name, controller_source in (("sample", source), ("long", long_source)):
+            with open(os.path.join(folder, "custom_controller.py"), "w") as file:
+                file.write(controller_source)
+            import custom_controller
+
+            def reload():
+                importlib.reload(custom_controller)
+                return custom_controller.CustomController
+
+            def load():
+                return controller_loader.load_controller(controller_source).CustomController
+
+            repetitions = 200
+            reload_time = timeit.timeit(reload, number=repetitions) / repetitions
+            load_time = timeit.timeit(load, number=repetitions) / repetitions
+            print(f"{name:>12} {reload_time * 1000:>12.3f} {load_time * 1000:>12.3f}")
+            del sys.modules["custom_controller"]
+
+if __name__ == "__main__":
+    main()
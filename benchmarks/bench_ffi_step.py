@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import esmini_binding
+import state_layer
+from simulator_stub import SimulatorStub
+
+"""Counts the calls into the simulator per simulated step and measures the steps per second of the simulation loop,
+for the previous loop with one state call per vehicle and for the batched step and fetch path.
+The simulator stub stands in for Esmini, so the steps per second show the overhead on the Python side."""
+
+
+# Counts the calls of every simulator function
+class CountingSimulator:
+    def __init__(self, simulator, batched):
+        self.simulator = simulator
+        self.batched = batched
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        if name == "SE_GetObjectStates" and not self.batched:
+            raise AttributeError(name)
+        function = getattr(self.simulator, name)
+
+        def counted(*args):
+            self.calls[name] += 1
+            return function(*args)
+        return counted
+
+
+def previous_loop(se, state, steps):
+    step = 0
+    while se.SE_GetQuitFlag() == 0 and se.SE_GetSimulationTime() < 30.0 and step < steps:
+        state.update()
+        se.SE_GetSimulationTime()
+        step += 1
+        state.set_speed(20)
+        se.SE_StepDT(0.1)
+
+def batched_loop(se, state, steps):
+    step = 0
+    while se.SE_GetQuitFlag() == 0 and step < steps:
+        simulation_time = se.SE_GetSimulationTime()
+        if simulation_time >= 30.0:
+            break
+        step += 1
+        state.set_speed(20)
+        esmini_binding.step_and_fetch(se, state, 0.1)
+
+
+def measure(loop, number_of_vehicles, batched, steps=300):
+    se = CountingSimulator(SimulatorStub(number_of_vehicles), batched)
+    state = state_layer.State(se)
+    state.update()
+    se.calls.clear()
+
+    start = time.perf_counter()
+    loop(se, state, steps)
+    elapsed = time.perf_counter() - start
+    return sum(se.calls.values()) / steps, steps / elapsed
+
+
+def main():
+    print(f"{'vehicles':>8} {'previous [calls/step]':>22} {'batched [calls/step]':>21} {'previous [steps/s]':>19} {'batched [steps/s]':>18}")
+    for number_of_vehicles in (2, 5, 10, 20, 40):
+        previous_calls, previous_rate = measure(previous_loop, number_of_vehicles, False)
+        batched_calls, batched_rate = measure(batched_loop, number_of_vehicles, True)
+        print(f"{number_of_vehicles:>8} {previous_calls:>22.1f} {batched_calls:>21.1f} {previous_rate:>19.0f} {batched_rate:>18.0f}")
+
+if __name__ == "__main__":
+    main()
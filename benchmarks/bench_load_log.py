@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd
+
+import report_gen_log
+from evaluation_suites import test_evaluation_suite
+from synthetic_log import create_log, write_csv
+
+"""Compares the column pruned load_log with reading and stripping the whole CSV log, as generate_report did before."""
+
+def load_whole_log(file_path):
+    df = pd.read_csv(file_path, skiprows=6)
+    df.columns = df.columns.str.strip()
+    return df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
+
+def main():
+    checks = test_evaluation_suite['scenarios_tests'][0][1]
+    ego_checks = [report_gen_log.max_ego_speed(30), report_gen_log.greatest_road_offset(9.7)]
+
+    print(f"{'vehicles':>8} {'whole log [ms]':>15} {'suite checks [ms]':>18} {'Ego checks [ms]':>16} {'peak memory [MB]':>17}")
+    with tempfile.TemporaryDirectory() as folder:
+        for number_of_vehicles in (2, 10, 20, 40):
+            file_path = os.path.join(folder, f"log_{number_of_vehicles}.csv")
+            write_csv(create_log(number_of_vehicles, seed=number_of_vehicles), file_path)
+
+            # The pruned log has to give the same reports as the whole log
+            whole_log = load_whole_log(file_path)
+            pruned_log, _ = report_gen_log.load_log(file_path, checks)
+            assert [check(whole_log) for check in checks] == [check(pruned_log) for check in checks]
+
+            repetitions = 10
+            whole_time = timeit.timeit(lambda: load_whole_log(file_path), number=repetitions) / repetitions
+            checks_time = timeit.timeit(lambda: report_gen_log.load_log(file_path, checks), number=repetitions) / repetitions
+            ego_time = timeit.timeit(lambda: report_gen_log.load_log(file_path, ego_checks), number=repetitions) / repetitions
+            _, stats = report_gen_log.load_log(file_path, checks, measure_memory=True)
+            print(f"{number_of_vehicles:>8} {whole_time * 1000:>15.1f} {checks_time * 1000:>18.1f} {ego_time * 1000:>16.1f} {stats['peak_memory_mb']:>17.2f}")
+
+if __name__ == "__main__":
+    main()
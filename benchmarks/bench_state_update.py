@@ -0,0 +1,98 @@
+import ctypes as ct
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import state_layer
+from custom_controller import CustomController
+from simulator_stub import SimulatorStub
+
+"""Compares the NumPy backed State with the previous State, which created new Vehicle objects on every update.
+Both are run against the simulator stub, so the times only include the Python side of a simulation step."""
+
+
+# The previous State, which creates a new Vehicle object per vehicle on every update
+class ObjectState(state_layer.State):
+    def __init__(self, simulator):
+        super().__init__(simulator)
+        self.vehicle_structs = {vehicle_id: state_layer.SE_ScenarioObjectState() for vehicle_id in self.vehicle_structs}
+        self.vehicles = []
+
+    def update(self):
+        self.vehicles = []
+        for vehicle_id, vehicle_state_struct in self.vehicle_structs.items():
+            return_code = self.simulator.SE_GetObjectState(vehicle_id, ct.byref(vehicle_state_struct))
+            if return_code != 0:
+                print("Something went wrong when vehicle struct was refreshed.")
+
+            vehicle = state_layer.Vehicle(
+                identity=vehicle_id,
+                position=(vehicle_state_struct.x, vehicle_state_struct.y, vehicle_state_struct.z),
+                speed=vehicle_state_struct.speed,
+                lane_id=vehicle_state_struct.laneId,
+                s=vehicle_state_struct.s,
+                t=vehicle_state_struct.t,
+                heading=vehicle_state_struct.h
+            )
+            self.vehicles.append(vehicle)
+
+
+# The stub is not stepped, only the state is updated, so that the time is spent in State
+class FrozenStub(SimulatorStub):
+    def SE_GetObjectState(self, vehicle_id, state_struct):
+        return 0
+
+    # State uses the batched call when the simulator has it
+    def SE_GetObjectStates(self, number_of_states, state_structs):
+        return 0
+
+    def SE_InjectSpeedAction(self, action):
+        pass
+
+
+# Runs the steps and returns the time per step in microseconds and the peak memory in bytes allocated on top of what was allocated before the steps
+def measure(state_class, number_of_vehicles, with_controller, steps=2000):
+    state = state_class(FrozenStub(number_of_vehicles))
+    controller = CustomController(state)
+    state.update()
+
+    def run():
+        for _ in range(steps):
+            state.update()
+            if with_controller:
+                controller.step()
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start = time.perf_counter()
+        run()
+        step_time = (time.perf_counter() - start) / steps * 1e6
+
+        tracemalloc.start()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    return step_time, peak_memory - memory_before
+
+
+def main():
+    for with_controller in (False, True):
+        print("controller step" if with_controller else "bare loop")
+        print(f"{'vehicles':>8} {'objects [us]':>13} {'numpy [us]':>11} {'objects peak [B]':>17} {'numpy peak [B]':>15}")
+        for number_of_vehicles in (2, 5, 10, 20, 40):
+            object_time, object_memory = measure(ObjectState, number_of_vehicles, with_controller)
+            numpy_time, numpy_memory = measure(state_layer.State, number_of_vehicles, with_controller)
+            print(f"{number_of_vehicles:>8} {object_time:>13.2f} {numpy_time:>11.2f} {object_memory:>17} {numpy_memory:>15}")
+        print()
+
+if __name__ == "__main__":
+    main()
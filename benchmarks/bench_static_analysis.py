@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import report_gen_static
+
+"""Compares the static analysis of one iteration in process with the previous analysis,
+which started flake8 three times as a subprocess (twice for the log string and once for the JSON)."""
+
+CONTROLLER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "custom_controller.py")
+
+def previous_iteration(file_path):
+    for _ in range(3):
+        subprocess.run([sys.executable, '-m', 'flake8', file_path], text=True, capture_output=True)
+    for _ in range(2):
+        report_gen_static.analyze_code(file_path)
+
+def current_iteration(file_path):
+    report_gen_static.static_analysis_string(file_path, 0, "task", False, False)
+    report_gen_static.static_analysis_json(file_path)
+
+def main():
+    start = time.perf_counter()
+    previous_iteration(CONTROLLER_PATH)
+    print(f"subprocesses: {(time.perf_counter() - start) * 1000:.0f} ms per iteration")
+
+    start = time.perf_counter()
+    current_iteration(CONTROLLER_PATH)
+    print(f"in process, first analysis: {(time.perf_counter() - start) * 1000:.0f} ms per iteration")
+
+    start = time.perf_counter()
+    current_iteration(CONTROLLER_PATH)
+    print(f"in process, unchanged controller: {(time.perf_counter() - start) * 1000:.2f} ms per iteration")
+
+if __name__ == "__main__":
+    main()
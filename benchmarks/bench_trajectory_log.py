@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import report_gen_log
+import state_layer
+import trajectory_log
+from evaluation_suites import test_evaluation_suite
+from simulator_stub import SimulatorStub
+from synthetic_log import write_csv
+
+"""Compares loading the binary trajectory log with parsing the same trajectory as a CSV log, for the checks of the test evaluation suite."""
+
+# Records a simulation of the simulator stub and saves it as a trajectory log and as a CSV log
+def record(number_of_vehicles, folder, number_of_steps=300):
+    simulator = SimulatorStub(number_of_vehicles)
+    state = state_layer.State(simulator)
+    state.update()
+    recorder = trajectory_log.TrajectoryRecorder(state)
+    for _ in range(number_of_steps):
+        recorder.record(simulator.SE_GetSimulationTime())
+        simulator.SE_StepDT(0.1)
+        state.update()
+
+    trajectory_path = os.path.join(folder, f"trajectory_{number_of_vehicles}.npy")
+    recorder.save(trajectory_path)
+    csv_path = os.path.join(folder, f"log_{number_of_vehicles}.csv")
+    df, _ = report_gen_log.load_trajectory(trajectory_path)
+    write_csv(df, csv_path)
+    return trajectory_path, csv_path
+
+def main():
+    checks = test_evaluation_suite['scenarios_tests'][0][1]
+
+    print(f"{'vehicles':>8} {'CSV [kB]':>9} {'binary [kB]':>12} {'CSV load [ms]':>14} {'binary load [ms]':>17}")
+    with tempfile.TemporaryDirectory() as folder:
+        for number_of_vehicles in (2, 10, 20, 40):
+            trajectory_path, csv_path = record(number_of_vehicles, folder)
+            csv_size = os.path.getsize(csv_path) / 1024
+            binary_size = (os.path.getsize(trajectory_path) + os.path.getsize(trajectory_log.header_path(trajectory_path))) / 1024
+
+            # Both logs give the same results
+            assert report_gen_log.generate_report(checks, csv_path) == report_gen_log.generate_report(checks, trajectory_path)
+
+            repetitions = 20
+            csv_time = timeit.timeit(lambda: report_gen_log.load_log(csv_path, checks), number=repetitions) / repetitions
+            binary_time = timeit.timeit(lambda: report_gen_log.load_trajectory(trajectory_path, checks), number=repetitions) / repetitions
+            print(f"{number_of_vehicles:>8} {csv_size:>9.0f} {binary_size:>12.0f} {csv_time * 1000:>14.2f} {binary_time * 1000:>17.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import base64
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import report_gen_vision
+
+"""Compares preparing the crash frames for the vision model the previous way, as full-resolution PNG files written to disk and read back,
+with the in-memory JPEG conversion, for screenshots of the size of the Esmini window."""
+
+# Writes TGA screenshots of 1200x800 pixels with a road, lane markings, trails and some noise, like rendered frames
+def write_screenshots(folder, number_of_frames=3):
+    rng = np.random.default_rng(0)
+    paths = []
+    for frame in range(number_of_frames):
+        pixels = np.full((800, 1200, 3), (96, 140, 80), dtype=np.uint8)
+        pixels[250:550] = (70, 70, 70)
+        pixels[348:352, ::40] = 255
+        pixels[448:452, ::40] = 255
+        pixels[380:420, 500 + frame * 30:580 + frame * 30] = (240, 240, 240)
+        pixels[480:520, 620:700] = (200, 30, 30)
+        pixels = np.clip(pixels + rng.normal(0, 6, pixels.shape), 0, 255).astype(np.uint8)
+        path = os.path.join(folder, f"screen_shot_{frame:05d}.tga")
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+# The conversion before the in-memory pipeline: PNG copies in a screen_shots folder and in the run folder, read back and encoded
+def previous_payload(frame_paths, folder):
+    screen_shots_folder = os.path.join(folder, "screen_shots")
+    run_folder = os.path.join(folder, "run")
+    os.makedirs(screen_shots_folder, exist_ok=True)
+    os.makedirs(run_folder, exist_ok=True)
+    for frame_path in frame_paths:
+        with Image.open(frame_path) as img:
+            new_filename = os.path.basename(frame_path)[:-4] + ".png"
+            img.save(os.path.join(screen_shots_folder, new_filename))
+            img.save(os.path.join(run_folder, new_filename))
+    payload = []
+    for file_name in sorted(os.listdir(screen_shots_folder)):
+        with open(os.path.join(screen_shots_folder, file_name), "rb") as file:
+            payload.append(base64.b64encode(file.read()).decode("utf-8"))
+    return payload
+
+def in_memory_payload(frame_paths, folder, image_size, jpeg_quality):
+    (images, copies) = report_gen_vision.convert_TGA(frame_paths, 0, "scenario", os.path.join(folder, "run"), image_size, jpeg_quality)
+    report_gen_vision.wait_for_copies(copies)
+    return [base64.b64encode(image).decode("utf-8") for image in images]
+
+def timed(function, *args, repetitions=5):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        result = function(*args)
+    return (time.perf_counter() - start) / repetitions, result
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        frame_paths = write_screenshots(folder)
+
+        print(f"{'pipeline':>28} {'time [ms]':>10} {'payload [kB]':>13}")
+        duration, payload = timed(previous_payload, frame_paths, folder)
+        print(f"{'PNG via disk, 1200x800':>28} {duration * 1000:>10.1f} {sum(map(len, payload)) / 1024:>13.0f}")
+        for image_size, jpeg_quality in (((1200, 800), 90), ((768, 512), 80), ((512, 342), 70)):
+            duration, payload = timed(in_memory_payload, frame_paths, folder, image_size, jpeg_quality)
+            name = f"JPEG q{jpeg_quality}, {image_size[0]}x{image_size[1]}"
+            print(f"{name:>28} {duration * 1000:>10.1f} {sum(map(len, payload)) / 1024:>13.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import esmini_binding
+import preflight
+import supervisor
+import svala
+from simulator_stub import SimulatorStub
+
+"""Runs controllers which raise exceptions of their own in supervised worker processes, as with time budgets, candidates
+or batch runs. Each one has to give an "error" result for its scenario instead of stopping the run.
+The simulator stub stands in for Esmini, so no scenario files are needed."""
+
+# Raises an exception of a class defined in the controller after a few steps, after the pre-flight check has passed
+CONTROLLER_EXCEPTION = '''
+class BrakingError(Exception):
+    pass
+
+class CustomController:
+    def __init__(self, state):
+        self.state = state
+        self.steps = 0
+
+    def step(self):
+        self.steps += 1
+        if self.steps > 5:
+            raise BrakingError("braking distance unknown")
+'''
+
+# Raises a built-in exception which refers to an object of a class defined in the controller
+CONTROLLER_OBJECT_IN_EXCEPTION = '''
+class Lane:
+    def __init__(self, lane_id):
+        self.lane_id = lane_id
+
+class CustomController:
+    def __init__(self, state):
+        self.state = state
+
+    def step(self):
+        error = ValueError("no free lane found")
+        error.lane = Lane(-3)
+        raise error
+'''
+
+# Raises a built-in exception which refers to the controller and its state, which can't be pickled
+CONTROLLER_STATE_IN_EXCEPTION = '''
+class CustomController:
+    def __init__(self, state):
+        self.state = state
+
+    def step(self):
+        error = ValueError("no lane found")
+        error.controller = self
+        raise error
+'''
+
+# Fails already in the pre-flight check
+PREFLIGHT_EXCEPTION = '''
+class SetupError(Exception):
+    pass
+
+class CustomController:
+    def __init__(self, state):
+        raise SetupError("no ego vehicle")
+
+    def step(self):
+        pass
+'''
+
+
+# Entry point of the workers. The stub is set up in the worker, so that this also works when workers are spawned instead of forked.
+def simulate_with_stub(*args):
+    esmini_binding.load_library = lambda bin_folder: SimulatorStub(6, duration=20)
+    esmini_binding.init = lambda library, args: 0
+    return svala.run_simulation_in_folder(*args)
+
+
+def main():
+    controllers = [("controller exception", CONTROLLER_EXCEPTION), ("controller object in exception", CONTROLLER_OBJECT_IN_EXCEPTION),
+        ("controller state in exception", CONTROLLER_STATE_IN_EXCEPTION)]
+    with tempfile.TemporaryDirectory() as folder:
+        args_list = []
+        for index, (_, source) in enumerate(controllers):
+            work_dir = os.path.join(folder, str(index))
+            os.makedirs(work_dir)
+            args_list.append(("stub.xosc", 10, work_dir, svala.ESMINI_BIN_FOLDER, source, True))
+        # A scenario budget makes svala use the supervised workers
+        results = supervisor.Supervisor(1, None, 30).run(simulate_with_stub, args_list)
+        results += supervisor.Supervisor(1, None, 30).run(preflight.run_check, [("custom_controller.py", PREFLIGHT_EXCEPTION)])
+
+    print(f"{'case':>32} {'result':>8}  message")
+    for (name, _), (run_result, message, _) in zip(controllers + [("pre-flight exception", None)], results):
+        print(f"{name:>32} {run_result:>8}  {message}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+"""Synthetic Esmini CSV logs for the benchmarks, with the columns used by the checks in report_gen_log."""
+
+VEHICLE_COLUMNS = [
+    "Entity_Name [-]",
+    "Current_Speed [m/s]",
+    "World_Position_X [m]",
+    "World_Position_Y [m]",
+    "Heading [rad]",
+    "Distance_Travelled_Along_Road_Segment [m]",
+    "Lateral_Distance_Lanem [m]",
+    "lane_id",
+    "collision_ids",
+]
+
+# Creates a log as a dataframe, in the form generate_report passes it to the checks
+def create_log(number_of_vehicles, number_of_frames=300, seed=0):
+    rng = np.random.default_rng(seed)
+    time = np.arange(number_of_frames) * 0.1
+    columns = {"Index [-]": np.arange(number_of_frames), "TimeStamp [s]": np.round(time, 3)}
+
+    for vehicle in range(1, number_of_vehicles + 1):
+        prefix = f"#{vehicle}"
+        speed = rng.uniform(20.0, 35.0) + np.cumsum(rng.normal(0.0, 0.1, number_of_frames))
+        s = rng.uniform(0.0, 300.0) + np.cumsum(speed * 0.1)
+        # Vehicles switch between the three lanes of the road now and then
+        lane = -2 - (np.cumsum(rng.random(number_of_frames) < 0.01) + rng.integers(0, 3)) % 3
+        collisions = np.full(number_of_frames, "", dtype=object)
+        if vehicle == 1:
+            collisions[number_of_frames // 2:number_of_frames // 2 + 10] = "1"
+
+        columns[f"{prefix} Entity_Name [-]"] = "Ego" if vehicle == 1 else f"Target{vehicle}"
+        columns[f"{prefix} Current_Speed [m/s]"] = np.round(speed, 3)
+        columns[f"{prefix} World_Position_X [m]"] = np.round(s, 3)
+        columns[f"{prefix} World_Position_Y [m]"] = np.round(lane * 3.5, 3)
+        columns[f"{prefix} Heading [rad]"] = 0.0
+        columns[f"{prefix} Distance_Travelled_Along_Road_Segment [m]"] = np.round(s, 3)
+        columns[f"{prefix} Lateral_Distance_Lanem [m]"] = np.round(lane * 3.5 + 1.75 + rng.normal(0.0, 0.1, number_of_frames), 3)
+        columns[f"{prefix} lane_id"] = lane
+        columns[f"{prefix} collision_ids"] = collisions
+
+    return pd.DataFrame(columns)
+
+# Writes a log in the layout of the Esmini CSV logger, six lines of header followed by columns separated by ", "
+def write_csv(df, file_path):
+    number_of_vehicles = len([column for column in df.columns if column.endswith("Entity_Name [-]")])
+    text = df.replace("", " ").to_csv(index=False, float_format="%.3f")
+    with open(file_path, "w") as file:
+        file.write(f"CSV logger\nVersion: synthetic\nScenario: synthetic\nEntities: {number_of_vehicles}\nTimestep: 0.1\n-\n")
+        file.write(text.replace(",", ", "))
@@ -1,48 +1,76 @@
-from openai import OpenAI
+import openai
+import llm_backend
+import json
 import os
+import random
 import shutil
 import time
 
+# TODO: Provide assistant_id
+ASSISTANT_ID = "TODO_ADD_ID"
+
+# Seconds a controller generation may take in total, including retries
+GENERATION_DEADLINE = 600
+
+# Number of times a run is started before the generation is given up, if runs fail or the API can't be reached
+MAX_ATTEMPTS = 3
+
+# Seconds of the first wait before a retry. The waits are drawn at random up to a limit which doubles with each attempt.
+BACKOFF_BASE = 2.0
+
+# Timing of the calls to the API, one JSON object per line in the run folder
+LATENCY_FILE = "llm_latency.jsonl"
+
+# Run states after which the run is started again
+RETRIED_STATUSES = ['failed', 'expired']
+
+# Run states in which the run still occupies its thread. A thread accepts no new run until the active one has ended.
+ACTIVE_STATUSES = ['queued', 'in_progress', 'requires_action', 'cancelling']
+
+# Seconds between the checks of a cancelled run
+CANCEL_POLL_INTERVAL = 0.5
+
+# Errors of the API which are temporary, after which the run is started again
+RETRIED_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError)
+
+
+# Generates a controller and saves it to controller_path. 
+# Candidates, generated at the same time as other controllers of the iteration, are saved with their number in the run folder.
+# A new thread gets the session and the number of the candidate in its metadata.
+def create_controller(requirement_specification, run_path, iteration, thread = None, deadline = GENERATION_DEADLINE, controller_path = './custom_controller.py', candidate = None, session = None):
+
+    # The client of the configured backend, shared by all generations of the process
+    client = llm_backend.get_client()
+    end_time = time.monotonic() + deadline
+    # Name of the generation in the run folder
+    label = iteration if candidate is None else f"{iteration}_candidate{candidate}"
 
-def create_controller(requirement_specification, run_path, iteration, thread = None):
-    
-    client = OpenAI()
-    
     if thread == None:
-        thread = client.beta.threads.create()
+        thread = timed_call(run_path, label, "create_thread", client.beta.threads.create, **thread_options(session, candidate))
 
     # Remove previous controller
-    remove_previous_controller()
+    remove_previous_controller(controller_path)
 
-    input_message = client.beta.threads.messages.create(
+    input_message = timed_call(run_path, label, "create_message", client.beta.threads.messages.create,
         thread_id=thread.id,
         role="user",
         content=requirement_specification
     )
 
-    # TODO: Provide assistant_id 
-    run = client.beta.threads.runs.create(
-        thread_id=thread.id,
-        assistant_id="TODO_ADD_ID",
-    )
-    
-    while run.status in ['queued', 'in_progress', 'cancelling']:
-        time.sleep(1) # Wait for 1 second
-        run = client.beta.threads.runs.retrieve(
-            thread_id=thread.id,
-            run_id=run.id
-    )
+    run = run_with_retries(client, thread, run_path, label, end_time)
 
-    if run.status == 'completed': 
-        messages = client.beta.threads.messages.list(
-            thread_id=thread.id, 
-            order='asc'
-        )
-    else:
-        print(run.status)
+    if run is None or run.status != 'completed':
+        # The thread is returned as it is, svala stops when no controller was created
+        print(f"Warning: The controller generation did not complete, run status {run.status if run is not None else 'unknown'}")
+        return thread, "", False
+
+    messages = list(timed_call(run_path, label, "list_messages", client.beta.threads.messages.list,
+        thread_id=thread.id,
+        order='asc'
+    ))
 
     # Save the entire messagelist
-    save_messages_to_file(messages, run_path, iteration)
+    save_messages_to_file(messages, run_path, label)
 
 
     # Accumulator for the text-part of the reponse.
@@ -55,26 +83,31 @@ def create_controller(requirement_specification, run_path, iteration, thread = N
 
         text += message_content.value
 
+        # Only the files of this run are downloaded, the earlier controllers of the thread are already saved in the run folder
+        if message.run_id != run.id:
+            continue
+
         for annotation in annotations:
-            file_path = getattr(annotation, 'file_path', None) 
+            file_path = getattr(annotation, 'file_path', None)
 
             if file_path:
                 file_number += 1
 
-                contentHpptx = client.files.content(file_path.file_id)
+                contentHpptx = timed_call(run_path, label, "download_file", client.files.content, file_path.file_id)
                 content = contentHpptx.read()
 
-                with open("./custom_controller.py", "wb") as file:
+                os.makedirs(os.path.dirname(controller_path) or ".", exist_ok=True)
+                with open(controller_path, "wb") as file:
                     file.write(content)
 
     correctNumberOfFiles = True
-    if file_number != (iteration+1):
+    if file_number != 1:
         print("Warning: No new file was created")
         correctNumberOfFiles = False
 
 
 
-    custom_controller_path = './custom_controller.py'
+    custom_controller_path = controller_path
     if os.path.exists(custom_controller_path):
         # Create or ensure the "controller" subdirectory exists
         controller_subdir = os.path.join(run_path, "controller")
@@ -82,13 +115,120 @@ def create_controller(requirement_specification, run_path, iteration, thread = N
             os.makedirs(controller_subdir)
         
         # Copy the custom_controller.py file to the "controller" subdirectory
-        shutil.copy(custom_controller_path, os.path.join(controller_subdir, f'{iteration}_custom_controller.py'))
-        
+        shutil.copy(custom_controller_path, os.path.join(controller_subdir, f'{label}_custom_controller.py'))
+
     return thread, text, correctNumberOfFiles
 
+# A new thread with the messages of the given one, so that candidates of the same iteration each continue the conversation on their own.
+# Only the text of the messages is copied, not the files attached to them.
+def fork_thread(thread, run_path, iteration, session=None, candidate=None):
+    client = llm_backend.get_client()
+    messages = timed_call(run_path, iteration, "list_messages", client.beta.threads.messages.list,
+        thread_id=thread.id,
+        order='asc'
+    )
+    copies = []
+    for message in messages:
+        text = "".join(content.text.value for content in message.content if content.type == "text")
+        if text:
+            copies.append({"role": message.role, "content": text})
+    return timed_call(run_path, iteration, "fork_thread", client.beta.threads.create, messages=copies, **thread_options(session, candidate))
+
+# Threads of runs and candidates made at the same time are created with different requests. 
+# Otherwise a replay could hand the thread recorded for one of them to another.
+def thread_options(session, candidate=None):
+    metadata = {}
+    if session is not None:
+        metadata["session"] = session
+    if candidate is not None:
+        metadata["candidate"] = str(candidate)
+    return {"metadata": metadata} if metadata else {}
+
+# Runs the assistant on the thread until the run has ended, following the events of the run as they are streamed.
+# Failed runs and temporary API errors are retried after a random wait, as long as the deadline allows. Returns the last run, None if none was started.
+# Other API errors end the generation without a run.
+def run_with_retries(client, thread, run_path, iteration, end_time):
+    run = None
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt > 0:
+            # Full jitter, so that concurrent generations do not retry at the same moments
+            wait = random.uniform(0, BACKOFF_BASE * 2 ** (attempt - 1))
+            if time.monotonic() + wait >= end_time:
+                break
+            print(f"Retrying the controller generation in {wait:.1f} s")
+            time.sleep(wait)
+
+        start = time.perf_counter()
+        try:
+            (run, first_token) = stream_run(client, thread, end_time)
+        except TimeoutError as e:
+            record_latency(run_path, iteration, "run", time.perf_counter() - start, attempt=attempt, status="deadline")
+            print(f"Warning: {e}")
+            return run
+        except RETRIED_ERRORS as e:
+            record_latency(run_path, iteration, "run", time.perf_counter() - start, attempt=attempt, status=type(e).__name__)
+            print(f"The controller generation failed: {e!r}")
+            # The run may still be active on the server after the connection to it was lost, which would block the next run on the thread
+            stop_active_run(client, thread, run_path, iteration, end_time)
+            continue
+        except openai.APIError as e:
+            record_latency(run_path, iteration, "run", time.perf_counter() - start, attempt=attempt, status=type(e).__name__)
+            print(f"The controller generation failed: {e!r}")
+            return None
+
+        record_latency(run_path, iteration, "run", time.perf_counter() - start, attempt=attempt, status=run.status, first_token_s=first_token)
+        if run.status not in RETRIED_STATUSES:
+            return run
+        print(f"The controller generation ended with status {run.status}: {run.last_error}")
+    return run
+
+# Starts a run and reads its events until it ends. Returns the final run and the seconds until the first text of the answer.
+# Raises a TimeoutError, after cancelling the run, if it has not ended at end_time.
+def stream_run(client, thread, end_time):
+    start = time.perf_counter()
+    first_token = None
+    # No event for the whole remaining time ends the stream with an APITimeoutError
+    with client.beta.threads.runs.stream(thread_id=thread.id, assistant_id=ASSISTANT_ID, timeout=max(1.0, end_time - time.monotonic())) as stream:
+        for event in stream:
+            if first_token is None and event.event == 'thread.message.delta':
+                first_token = round(time.perf_counter() - start, 3)
+            if time.monotonic() > end_time:
+                run = stream.current_run
+                if run is not None:
+                    client.beta.threads.runs.cancel(thread_id=thread.id, run_id=run.id)
+                raise TimeoutError("The controller generation exceeded its deadline")
+        return stream.get_final_run(), first_token
+
+# Cancels the latest run of the thread if it is still active and waits until it has ended, at most until end_time
+def stop_active_run(client, thread, run_path, iteration, end_time):
+    try:
+        runs = timed_call(run_path, iteration, "list_runs", client.beta.threads.runs.list, thread_id=thread.id, limit=1, order='desc')
+        run = next(iter(runs), None)
+        if run is None or run.status not in ACTIVE_STATUSES:
+            return
+        if run.status != 'cancelling':
+            run = timed_call(run_path, iteration, "cancel_run", client.beta.threads.runs.cancel, thread_id=thread.id, run_id=run.id)
+        while run.status in ACTIVE_STATUSES and time.monotonic() + CANCEL_POLL_INTERVAL < end_time:
+            time.sleep(CANCEL_POLL_INTERVAL)
+            run = timed_call(run_path, iteration, "retrieve_run", client.beta.threads.runs.retrieve, thread_id=thread.id, run_id=run.id)
+    except openai.APIError as e:
+        # The next attempt is made anyway, the API rejects it if the run is still active
+        print(f"The previous run could not be stopped: {e!r}")
+
+# Calls the API function and records how long the call took
+def timed_call(run_path, iteration, name, function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    record_latency(run_path, iteration, name, time.perf_counter() - start)
+    return result
+
+def record_latency(run_path, iteration, call, seconds, **details):
+    os.makedirs(run_path, exist_ok=True)
+    with open(os.path.join(run_path, LATENCY_FILE), "a") as file:
+        file.write(json.dumps({"iteration": iteration, "call": call, "seconds": round(seconds, 3), **details}) + "\n")
+
 
-def remove_previous_controller():
-    custom_controller_path = './custom_controller.py'
+def remove_previous_controller(custom_controller_path = './custom_controller.py'):
     if os.path.exists(custom_controller_path):
         os.remove(custom_controller_path)
 
@@ -0,0 +1,51 @@
+import hashlib
+import linecache
+import sys
+import types
+
+"""Loads controllers from their source code instead of importing custom_controller.py from the current directory.
+Each version of a controller is compiled once per process and run as a module named after the hash of its source,
+so different versions can be loaded side by side and none of them depends on the files in the working directory."""
+
+# Compiled controllers by the hash of their source
+code_cache = {}
+
+# Prefix of the names of the modules controllers are loaded as
+MODULE_PREFIX = "custom_controller_"
+
+
+def source_hash(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+# The code object of the controller source, compiled on the first call for each version. Raises a SyntaxError for invalid code.
+def compile_controller(source, file_name="custom_controller.py"):
+    key = source_hash(source)
+    if key not in code_cache:
+        code_cache[key] = compile(source, file_name, "exec")
+    # Tracebacks and inspect show the lines of the controller, even though it is not read from a file
+    linecache.cache[file_name] = (len(source), None, source.splitlines(True), file_name)
+    return code_cache[key]
+
+# Runs the controller source in a new module and returns it. Every call gives a new module, so nothing the controller
+# stores in module or class variables is carried over between simulations.
+def load_controller(source, file_name="custom_controller.py"):
+    code = compile_controller(source, file_name)
+    module_name = f"{MODULE_PREFIX}{source_hash(source)[:16]}"
+    module = types.ModuleType(module_name)
+    module.__file__ = file_name
+    # Registered while the code runs, like an import, so that e.g. dataclasses in the controller can look up their module
+    sys.modules[module_name] = module
+    exec(code, module.__dict__)
+    return module
+
+# Exceptions of classes defined by the controller can only be unpickled in processes which have loaded it.
+# They are replaced by a RuntimeError with the name of the class in the message, so that they can be sent from worker processes.
+def portable_exception(e):
+    if type(e).__module__.startswith(MODULE_PREFIX):
+        return RuntimeError(f"{type(e).__name__}: {e}")
+    return e
+
+# Reads the controller file, so that it can be loaded in processes with another working directory
+def read_controller(file_path="custom_controller.py"):
+    with open(file_path) as file:
+        return file.read()
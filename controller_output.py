@@ -0,0 +1,98 @@
+import os
+from collections import deque
+
+"""Capture of what the controller prints during a simulation, instead of writing it to the console on every step.
+Repeated lines are counted instead of stored again, and only the first and the last lines are kept, so the memory use is bounded."""
+
+# The captured output of a simulation, relative to its working directory
+OUTPUT_PATH = os.path.join("recordings", "controller_output.txt")
+
+# Number of distinct lines kept from the start and from the end of the output
+HEAD_LINES = 20
+TAIL_LINES = 40
+
+# Longer lines are cut
+MAX_LINE_LENGTH = 300
+
+
+class ControllerOutput:
+    def __init__(self, head_lines=HEAD_LINES, tail_lines=TAIL_LINES):
+        self.head_lines = head_lines
+        self.head = []
+        self.tail = deque(maxlen=tail_lines)
+        self.omitted_lines = 0
+        self.partial_line = ""
+        # The current line as [first step, text, number of times printed in a row]
+        self.current = None
+        # The simulation step the controller is in, set by the simulation loop
+        self.step = 0
+
+    # File interface, so that the object can replace sys.stdout while the controller runs
+    def write(self, text):
+        lines = (self.partial_line + text).split("\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            self.add_line(line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def add_line(self, line):
+        line = line[:MAX_LINE_LENGTH]
+        if self.current is not None and self.current[1] == line:
+            self.current[2] += 1
+            return
+        self.store_current()
+        self.current = [self.step, line, 1]
+
+    def store_current(self):
+        if self.current is None:
+            return
+        if len(self.head) < self.head_lines:
+            self.head.append(self.current)
+        else:
+            if len(self.tail) == self.tail.maxlen:
+                self.omitted_lines += 1
+            self.tail.append(self.current)
+        self.current = None
+
+    def close(self):
+        if self.partial_line:
+            self.add_line(self.partial_line)
+            self.partial_line = ""
+        self.store_current()
+
+    def __bool__(self):
+        return bool(self.head or self.tail or self.current or self.partial_line)
+
+    # The kept lines with the step they were first printed at and how often they were repeated
+    def text(self):
+        self.close()
+        lines = [format_line(entry) for entry in self.head]
+        if self.omitted_lines:
+            lines.append(f"... {self.omitted_lines} lines omitted ...")
+        lines.extend(format_line(entry) for entry in self.tail)
+        return "\n".join(lines)
+
+    def save(self, output_path=OUTPUT_PATH):
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "w") as file:
+            file.write(self.text())
+
+
+def format_line(entry):
+    step, line, count = entry
+    repeats = f" (printed {count} times in a row)" if count > 1 else ""
+    return f"[step {step}] {line}{repeats}"
+
+# The first and the last lines of a saved output, for attaching to the reports. Empty if the controller printed nothing.
+def load_excerpt(output_path, max_lines=10):
+    if not os.path.exists(output_path):
+        return ""
+    with open(output_path) as file:
+        lines = file.read().splitlines()
+    if len(lines) > max_lines:
+        half = max_lines // 2
+        lines = lines[:half] + [f"... {len(lines) - 2 * half} more lines ..."] + lines[-half:]
+    return "\n".join(lines)
@@ -5,10 +5,9 @@ class CustomController:
 
     def step(self):
 
-        ego = self.state.vehicles[0]
-        other = self.state.vehicles[1]
+        gap = self.state.gap_to_leader()
 
-        if (ego.lane_id == other.lane_id) and (ego.s > other.s - 50):
+        if gap is not None and gap < 50:
             self.state.set_speed(0)
             print("breaking")
         else:
@@ -22,8 +21,12 @@ class State:
         ...
         # a list of all the cars in the simulation.
         # car [0] is the "ego" car and it is the one this controller operates. 
+        # The vehicles are updated in place every step, vehicle.snapshot() returns a copy that keeps the current values.
         self.vehicles = [] 
 
+    # The actions below are carried out when step() returns. If an action is called several times in a step, the last call counts 
+    # (the first for switch_lane). Repeating the same action in later steps changes nothing.
+
     # Changes the lane which the ego car uses.
     # 1 makes the car switch one lane to the left and -1 changes one lane to the right
     def switch_lane(self, lane_id):
@@ -43,6 +46,29 @@ class State:
     def set_offset(self, offset):
         ...
 
+    # Queries about the vehicles around a vehicle, given by its index in self.vehicles (0 is the ego car).
+    # Ahead means a greater s. Without a lane_id the lane of the vehicle is used, otherwise the given lane, e.g. ego.lane_id + 1 for the lane to the left.
+
+    # The vehicles in a lane, sorted by s.
+    def vehicles_in_lane(self, lane_id):
+        ...
+
+    # The closest vehicle ahead or behind the vehicle. None if there is no such vehicle.
+    def leader(self, vehicle_number=0, lane_id=None):
+        ...
+    def follower(self, vehicle_number=0, lane_id=None):
+        ...
+
+    # Distance in meters along the road to the leader or follower. None if there is no such vehicle.
+    def gap_to_leader(self, vehicle_number=0, lane_id=None):
+        ...
+    def gap_to_follower(self, vehicle_number=0, lane_id=None):
+        ...
+
+    # Seconds until the vehicle reaches its leader at the current speeds. None if there is no leader, math.inf if the vehicle is not faster than the leader.
+    def time_to_collision(self, vehicle_number=0, lane_id=None):
+        ...
+
 class Vehicle:
     def __init__(self, identity, position, speed, lane_id, s, t):
         self.id = identity # Int
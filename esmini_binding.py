@@ -0,0 +1,79 @@
+import ctypes as ct
+import os
+import sys
+
+import state_layer
+
+"""Loading of the Esmini library, with the argument and return types of the functions Svala uses.
+The library is loaded and prototyped once per process and reused by all simulations in the process."""
+
+LIBRARY_FILES = {
+    "linux": "libesminiLib.so",
+    "linux2": "libesminiLib.so",
+    "darwin": "libesminiLib.dylib",
+    "win32": "esminiLib.dll",
+}
+
+# (argument types, return type) of the Esmini functions
+PROTOTYPES = {
+    "SE_InitWithArgs": ([ct.c_int, ct.POINTER(ct.c_char_p)], ct.c_int),
+    "SE_GetQuitFlag": ([], ct.c_int),
+    "SE_GetSimulationTime": ([], ct.c_float),
+    "SE_StepDT": ([ct.c_float], ct.c_int),
+    "SE_GetNumberOfObjects": ([], ct.c_int),
+    "SE_GetId": ([ct.c_int], ct.c_int),
+    "SE_GetObjectState": ([ct.c_int, ct.POINTER(state_layer.SE_ScenarioObjectState)], ct.c_int),
+    "SE_GetObjectName": ([ct.c_int], ct.c_char_p),
+    "SE_GetObjectNumberOfCollisions": ([ct.c_int], ct.c_int),
+    "SE_GetObjectCollision": ([ct.c_int, ct.c_int], ct.c_int),
+    "SE_InjectSpeedAction": ([ct.POINTER(state_layer.SESpeedActionStruct)], None),
+    "SE_InjectLaneOffsetAction": ([ct.POINTER(state_layer.SELaneOffsetActionStruct)], None),
+    "SE_InjectLaneChangeAction": ([ct.POINTER(state_layer.SELaneChangeActionStruct)], None),
+    "SE_InjectedActionOngoing": ([ct.c_int], ct.c_bool),
+    "SE_SaveImagesToFile": ([ct.c_int], ct.c_int),
+}
+
+# Fills an array of object states in one call, not available in all Esmini versions
+BATCH_PROTOTYPES = {
+    "SE_GetObjectStates": ([ct.POINTER(ct.c_int), ct.POINTER(state_layer.SE_ScenarioObjectState)], ct.c_int),
+}
+
+# Loaded libraries by path
+libraries = {}
+
+
+# Returns the Esmini library in bin_folder, loading and prototyping it on the first call in the process
+def load_library(bin_folder):
+    if sys.platform not in LIBRARY_FILES:
+        print("Unsupported platform: {}".format(sys.platform))
+        quit()
+
+    library_path = os.path.abspath(os.path.join(bin_folder, LIBRARY_FILES[sys.platform]))
+    if library_path not in libraries:
+        libraries[library_path] = prototype(ct.CDLL(library_path))
+    return libraries[library_path]
+
+def prototype(library):
+    for name, (argument_types, return_type) in PROTOTYPES.items():
+        function = getattr(library, name)
+        function.argtypes = argument_types
+        function.restype = return_type
+    for name, (argument_types, return_type) in BATCH_PROTOTYPES.items():
+        try:
+            function = getattr(library, name)
+        except AttributeError:
+            continue
+        function.argtypes = argument_types
+        function.restype = return_type
+    return library
+
+# Initializes a simulation with the command line arguments
+def init(library, args):
+    argv = (ct.c_char_p * len(args))(*[arg.encode("utf-8") for arg in args])
+    return library.SE_InitWithArgs(len(args), argv)
+
+# Steps the simulation and fetches the states of all vehicles into the state.
+# With a library that has SE_GetObjectStates this is two calls into Esmini, regardless of the number of vehicles.
+def step_and_fetch(library, state, dt=0.1):
+    library.SE_StepDT(dt)
+    state.update()
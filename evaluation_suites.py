@@ -9,6 +9,19 @@ from report_gen_log import *
 #     'create_new_controller': ,    - Bool:     Whether to generate a controllers (debug)
 #     'use_vision_api': ,           - Bool:     Whether to generate commentary based on screenshots
 #     'number_of_iterations': ,     - Int       Max number of corrections during iterative improvements
+#     'parallel_workers': ,         - Int       Optional, number of scenarios simulated in parallel (default 1)
+#     'headless': ,                 - Bool      Optional, simulate without window and screenshots, replaying crashes for vision (default False)
+#     'use_result_cache': ,         - Bool      Optional, reuse results of earlier simulations of an equivalent controller (default False)
+#     'result_cache_size_mb': ,     - Int       Optional, size limit of the result cache in MB (default 500)
+#     'online_checks': ,            - Bool      Optional, evaluate the checks during the simulation and end it once all have failed (default False)
+#     'step_time_budget': ,         - Float     Optional, seconds a single controller step may take before the simulation is stopped as a timeout (default None)
+#     'scenario_time_budget': ,     - Float     Optional, seconds a whole simulation may take before it is stopped as a timeout (default None)
+#     'csv_log': ,                  - Bool      Optional, let Esmini write a CSV log next to the binary trajectory log the checks use (default False)
+#     'generation_deadline': ,      - Float     Optional, seconds a controller generation may take including retries before it is given up (default 600)
+#     'candidates': ,               - Int       Optional, number of controllers requested and tested at the same time in each iteration, the best is kept (default 1)
+#     'llm_backend': ,              - Dict      Optional, e.g. {"mode": "replay", "recordings": "llm_recordings"}, modes live, record, replay, stand_in (default live)
+#     'vision_image_size': ,        - Tuple     Optional, (width, height) in pixels the screenshots are cropped and scaled to for the vision model (default (768, 512))
+#     'vision_jpeg_quality': ,      - Int       Optional, JPEG quality from 1 to 95 of the screenshots sent to the vision model (default 80)
 #     'scenarios_tests': [          - List      Scenarios and associated test cases used for evluation 
 #         ('cut-in_high.xosc', [    - String    File name of scenario
 #             test1,                - Function  Test case function
@@ -0,0 +1,66 @@
+import json
+import os
+from collections import deque
+
+"""Bookkeeping of the screenshots Esmini saves during a simulation, indexed by the step they were captured at.
+Only the latest frames are kept on disk, older ones are deleted as new ones are captured. The index is saved with the other
+recordings, so the frames around a collision can be picked by step without listing or opening the other files in the folder."""
+
+# The index of a simulation, relative to its working directory
+INDEX_PATH = os.path.join("recordings", "frames.json")
+
+# Esmini writes the screenshots of a run to its working directory, numbered in the order they were captured starting from 0
+FRAME_FILE = "screen_shot_{:05d}.tga"
+
+# Number of frames kept on disk, enough for every frame of a 30 s scenario captured every 10 steps
+CAPACITY = 32
+
+
+class FrameBuffer:
+    def __init__(self, capacity=CAPACITY, folder=""):
+        self.folder = folder
+        # (step, file name) of the kept frames, oldest first
+        self.frames = deque()
+        self.capacity = capacity
+        self.number_of_frames = 0
+
+    # Called after Esmini was asked to save a screenshot at the given step
+    def captured(self, step):
+        self.frames.append((step, FRAME_FILE.format(self.number_of_frames)))
+        self.number_of_frames += 1
+        if len(self.frames) > self.capacity:
+            (_, file_name) = self.frames.popleft()
+            remove_frame(os.path.join(self.folder, file_name))
+
+    def save(self, index_path=INDEX_PATH):
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        with open(index_path, "w") as file:
+            json.dump({"captured": self.number_of_frames, "frames": list(self.frames)}, file)
+
+
+# The kept frames of a simulation as a dict from step to the path of the screenshot, empty if none were captured
+def load_index(folder):
+    index_path = os.path.join(folder, INDEX_PATH)
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path) as file:
+        frames = json.load(file)["frames"]
+    return {step: os.path.join(folder, file_name) for step, file_name in frames}
+
+# The paths of the frames captured at most max_distance steps from the crash step, in the order they were captured
+def select_frames(index, crash_step, max_distance):
+    return [index[step] for step in sorted(index) if abs(step - crash_step) <= max_distance]
+
+# Deletes the screenshots of the index and the index itself
+def remove_frames(folder, index=None):
+    if index is None:
+        index = load_index(folder)
+    for frame_path in index.values():
+        remove_frame(frame_path)
+    remove_frame(os.path.join(folder, INDEX_PATH))
+
+def remove_frame(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
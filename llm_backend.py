@@ -0,0 +1,328 @@
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+"""Selects where the requests of the controller creator and the vision report go. The modes are:
+live      - the OpenAI API, as without this module
+record    - the OpenAI API, with every request and its response saved to a folder
+replay    - the saved responses, without any connection to the API
+stand_in  - made-up responses: a fixed controller file for each generation and a fixed text for each vision report
+
+The modes other than live run a local HTTP server with the same API as OpenAI, which the client is pointed to.
+Recordings are keyed by a hash of the request and how many times the same request was made before, so a replayed
+run gets the same responses in the same order as the recorded one, including the controller files."""
+
+MODES = ("live", "record", "replay", "stand_in")
+
+# Folder of the recordings, relative to the directory Svala is started in
+RECORDINGS_FOLDER = "llm_recordings"
+
+# Address the requests are forwarded to in record mode
+UPSTREAM_URL = "https://api.openai.com/v1"
+
+# Answer of the stand-in to vision requests
+STAND_IN_VISION_REPORT = "Stand-in vision report: the screenshots were not analysed."
+
+# Configuration set by configure, and the client and server created from it on first use
+settings = {"mode": "live"}
+client = None
+server = None
+lock = threading.Lock()
+
+
+# Sets the backend for the rest of the process from the 'llm_backend' entry of an evaluation suite, e.g.
+# {"mode": "replay", "recordings": "llm_recordings"} or {"mode": "stand_in", "controller": "custom_controller.py", "latency": 2.0}.
+# None keeps the live API. The same settings again keep the current client, so suites running at the same time can share it.
+def configure(backend_settings=None):
+    global settings, client
+    backend_settings = dict(backend_settings or {"mode": "live"})
+    if backend_settings.get("mode", "live") not in MODES:
+        raise ValueError(f"Unknown LLM backend mode {backend_settings.get('mode')}, expected one of {MODES}")
+    with lock:
+        if backend_settings == settings:
+            return
+        stop_server()
+        settings = backend_settings
+        client = None
+
+# The OpenAI client for the configured backend, shared by all callers of the process
+def get_client():
+    global client, server
+    with lock:
+        if client is None:
+            mode = settings.get("mode", "live")
+            if mode == "live":
+                client = OpenAI()
+            else:
+                server = StandInServer(mode, settings.get("recordings", RECORDINGS_FOLDER), settings.get("controller"), settings.get("latency", 0.0))
+                # Without the live API no key is needed, in record mode the key is forwarded
+                api_key = os.environ.get("OPENAI_API_KEY") if mode == "record" else "stand-in"
+                client = OpenAI(api_key=api_key, base_url=server.url, max_retries=0 if mode != "record" else 2)
+        return client
+
+def stop_server():
+    global server
+    if server is not None:
+        server.stop()
+        server = None
+
+
+# Request/response pairs saved as one JSON file per pair
+class RecordingStore:
+    def __init__(self, folder):
+        self.folder = folder
+        # Number of times each request has been made in this process
+        self.occurrences = Counter()
+        self.lock = threading.Lock()
+
+    # The key of a request, counting repetitions of the same request
+    def key(self, method, path, body):
+        try:
+            # JSON bodies are compared by content, not by formatting
+            body = json.dumps(json.loads(body), sort_keys=True).encode("utf-8")
+        except ValueError:
+            pass
+        request_hash = hashlib.sha256(method.encode("utf-8") + b" " + path.encode("utf-8") + b"\n" + body).hexdigest()[:32]
+        with self.lock:
+            occurrence = self.occurrences[request_hash]
+            self.occurrences[request_hash] += 1
+        return f"{request_hash}_{occurrence}"
+
+    def load(self, key):
+        path = os.path.join(self.folder, key + ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            recording = json.load(file)
+        body = recording["body"].encode("utf-8") if recording["encoding"] == "text" else base64.b64decode(recording["body"])
+        return (recording["status"], recording["content_type"], body)
+
+    def save(self, key, method, path, request_body, status, content_type, body):
+        os.makedirs(self.folder, exist_ok=True)
+        # Text bodies are stored as text, so that e.g. the controller files can be read in the recording
+        try:
+            body_text, encoding = body.decode("utf-8"), "text"
+        except UnicodeDecodeError:
+            body_text, encoding = base64.b64encode(body).decode("ascii"), "base64"
+        recording = {
+            "method": method,
+            "path": path,
+            "request": request_body.decode("utf-8", errors="replace"),
+            "status": status,
+            "content_type": content_type,
+            "encoding": encoding,
+            "body": body_text
+        }
+        with open(os.path.join(self.folder, key + ".json"), "w") as file:
+            json.dump(recording, file, indent=2)
+
+
+# Local server with the API of OpenAI, answering from the recordings, the upstream API or the stand-in responses
+class StandInServer:
+    def __init__(self, mode, recordings_folder=RECORDINGS_FOLDER, controller_path=None, latency=0.0, port=0):
+        self.mode = mode
+        self.store = RecordingStore(recordings_folder)
+        # The stand-in hands out the controller file as it is when the server starts, since the controller creator deletes it
+        controller_path = controller_path or "custom_controller.py"
+        self.controller = b""
+        if mode == "stand_in" and os.path.exists(controller_path):
+            with open(controller_path, "rb") as file:
+                self.controller = file.read()
+        # Seconds each stand-in run or vision request takes, to imitate the time of the model
+        self.latency = latency
+        self.api = StandInAPI(self)
+        self.http_server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(self))
+        self.http_server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.http_server.server_address[1]}/v1"
+        self.thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+    # Returns (status, content type, body) for a request
+    def respond(self, method, path, request_body, headers):
+        if self.mode == "stand_in":
+            return self.api.respond(method, path, request_body)
+
+        key = self.store.key(method, path, request_body)
+        if self.mode == "replay":
+            response = self.store.load(key)
+            if response is None:
+                return error_response(404, f"No recorded response for {method} {path} ({key}) in {self.store.folder}")
+            return response
+
+        response = forward(method, path, request_body, headers)
+        self.store.save(key, method, path, request_body, *response)
+        return response
+
+
+def make_handler(stand_in_server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def handle_request(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request_body = self.rfile.read(length) if length else b""
+            (status, content_type, body) = stand_in_server.respond(self.command, self.path, request_body, self.headers)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_DELETE = handle_request
+
+        # Requests are not logged to the console
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+# Sends the request to the upstream API and returns its response, errors included
+def forward(method, path, request_body, headers):
+    upstream_path = path[len("/v1"):] if path.startswith("/v1") else path
+    forwarded_headers = {name: headers[name] for name in ("Authorization", "Content-Type", "OpenAI-Beta", "OpenAI-Organization") if headers.get(name)}
+    request = urllib.request.Request(UPSTREAM_URL + upstream_path, data=request_body or None, headers=forwarded_headers, method=method)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return (response.status, response.headers.get("Content-Type", "application/json"), response.read())
+    except urllib.error.HTTPError as e:
+        return (e.code, e.headers.get("Content-Type", "application/json"), e.read())
+
+def error_response(status, message):
+    return (status, "application/json", json.dumps({"error": {"message": message, "type": "invalid_request_error"}}).encode("utf-8"))
+
+
+# The parts of the assistants and chat completions API that the controller creator and the vision report use
+class StandInAPI:
+    def __init__(self, stand_in_server):
+        self.server = stand_in_server
+        self.ids = itertools.count(1)
+        # Messages by thread id
+        self.threads = {}
+        # Runs by thread id, latest last
+        self.runs = {}
+        self.lock = threading.Lock()
+
+    def new_id(self, prefix):
+        with self.lock:
+            return f"{prefix}_standin{next(self.ids)}"
+
+    def respond(self, method, path, request_body):
+        url = urllib.parse.urlparse(path)
+        parts = url.path.strip("/").split("/")[1:]
+        body = json.loads(request_body) if request_body else {}
+
+        if method == "POST" and parts == ["threads"]:
+            return json_response(self.create_thread(body.get("messages", [])))
+        if method == "POST" and parts == ["chat", "completions"]:
+            time.sleep(self.server.latency)
+            return json_response(chat_completion(self.new_id("chatcmpl"), body.get("model", ""), STAND_IN_VISION_REPORT))
+        if len(parts) >= 2 and parts[0] == "threads":
+            thread_id = parts[1]
+            if thread_id not in self.threads:
+                return error_response(404, f"No thread found with id '{thread_id}'.")
+            if method == "POST" and parts[2:] == ["messages"]:
+                return json_response(self.add_message(thread_id, "user", body.get("content", ""), None, []))
+            if method == "GET" and parts[2:] == ["messages"]:
+                return json_response(self.list_messages(thread_id, urllib.parse.parse_qs(url.query)))
+            if method == "POST" and parts[2:] == ["runs"]:
+                return self.run(thread_id, body.get("assistant_id", ""))
+            if method == "GET" and parts[2:] == ["runs"]:
+                return json_response(self.list_runs(thread_id))
+            if method == "GET" and len(parts) == 4 and parts[2] == "runs":
+                return json_response(run_object(parts[3], thread_id, "", "completed"))
+            if method == "POST" and len(parts) == 5 and parts[2] == "runs" and parts[4] == "cancel":
+                return json_response(run_object(parts[3], thread_id, "", "cancelled"))
+        if method == "GET" and len(parts) == 3 and parts[0] == "files" and parts[2] == "content":
+            return (200, "application/octet-stream", self.server.controller)
+        return error_response(404, f"The stand-in does not implement {method} {url.path}")
+
+    def create_thread(self, messages):
+        thread_id = self.new_id("thread")
+        self.threads[thread_id] = []
+        self.runs[thread_id] = []
+        for message in messages:
+            self.add_message(thread_id, message.get("role", "user"), message.get("content", ""), None, [])
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}, "tool_resources": {}}
+
+    def add_message(self, thread_id, role, text, run_id, annotations):
+        message = {
+            "id": self.new_id("msg"), "object": "thread.message", "created_at": int(time.time()), "thread_id": thread_id,
+            "role": role, "status": "completed", "run_id": run_id, "assistant_id": None, "attachments": [], "metadata": {},
+            "content": [{"type": "text", "text": {"value": text, "annotations": annotations}}]
+        }
+        self.threads[thread_id].append(message)
+        return message
+
+    def list_messages(self, thread_id, query):
+        messages = self.threads[thread_id]
+        if query.get("order", ["desc"])[0] == "desc":
+            messages = messages[::-1]
+        return {"object": "list", "data": messages, "first_id": messages[0]["id"] if messages else None,
+                "last_id": messages[-1]["id"] if messages else None, "has_more": False}
+
+    # The runs of the stand-in are completed as soon as their stream has been sent
+    def list_runs(self, thread_id):
+        runs = [run_object(run_id, thread_id, "", "completed") for run_id in self.runs[thread_id][::-1]]
+        return {"object": "list", "data": runs, "first_id": runs[0]["id"] if runs else None,
+                "last_id": runs[-1]["id"] if runs else None, "has_more": False}
+
+    # A streamed run which answers with one message and the controller file attached to it
+    def run(self, thread_id, assistant_id):
+        run_id = self.new_id("run")
+        self.runs[thread_id].append(run_id)
+        events = [("thread.run.created", run_object(run_id, thread_id, assistant_id, "queued")),
+                  ("thread.run.in_progress", run_object(run_id, thread_id, assistant_id, "in_progress"))]
+        time.sleep(self.server.latency)
+        file_id = self.new_id("file")
+        annotation = {"type": "file_path", "text": "sandbox:/mnt/data/custom_controller.py", "start_index": 0, "end_index": 0, "file_path": {"file_id": file_id}}
+        message = self.add_message(thread_id, "assistant", "Stand-in controller: sandbox:/mnt/data/custom_controller.py", run_id, [annotation])
+        message["assistant_id"] = assistant_id
+        events += [("thread.message.created", message), ("thread.message.completed", message),
+                   ("thread.run.completed", run_object(run_id, thread_id, assistant_id, "completed"))]
+        stream = "".join(f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in events) + "event: done\ndata: [DONE]\n\n"
+        return (200, "text/event-stream", stream.encode("utf-8"))
+
+
+def json_response(data):
+    return (200, "application/json", json.dumps(data).encode("utf-8"))
+
+def run_object(run_id, thread_id, assistant_id, status):
+    return {"id": run_id, "object": "thread.run", "created_at": int(time.time()), "thread_id": thread_id, "assistant_id": assistant_id,
+            "status": status, "last_error": None, "instructions": "", "model": "stand-in", "tools": [], "metadata": {},
+            "parallel_tool_calls": True}
+
+def chat_completion(completion_id, model, text):
+    return {"id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]}
+
+
+# Runs a server on its own, e.g. for pointing other tools to it with OPENAI_BASE_URL
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local server with the OpenAI API used by Svala")
+    parser.add_argument("--mode", choices=MODES[1:], default="stand_in")
+    parser.add_argument("--recordings", default=RECORDINGS_FOLDER)
+    parser.add_argument("--controller", default=None, help="Controller file handed out by the stand-in")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each stand-in answer takes")
+    parser.add_argument("--port", type=int, default=8765)
+    arguments = parser.parse_args()
+    stand_in_server = StandInServer(arguments.mode, arguments.recordings, arguments.controller, arguments.latency, arguments.port)
+    print(f"Serving {arguments.mode} at {stand_in_server.url}")
+    try:
+        stand_in_server.thread.join()
+    except KeyboardInterrupt:
+        stand_in_server.stop()
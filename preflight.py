@@ -0,0 +1,69 @@
+import contextlib
+import inspect
+
+import controller_loader
+import state_layer
+import supervisor
+from controller_output import ControllerOutput
+from simulator_stub import SimulatorStub
+
+"""Checks of the controller file made before any simulator is started, so that a controller which can't run at all
+is reported once for the whole scenario set instead of once per scenario."""
+
+# Number of controller steps run against the simulator stub
+DRY_RUN_STEPS = 3
+
+
+# Returns None if the controller passed all checks, otherwise the exception describing the first problem found.
+# The source is read from file_path unless it is given.
+def check_controller(file_path="custom_controller.py", dry_run_steps=DRY_RUN_STEPS, source=None):
+    try:
+        if source is None:
+            source = controller_loader.read_controller(file_path)
+        # Compiling first gives syntax errors without running any of the code. The simulations reuse the compiled code.
+        # The file name is the one of the checked file, since Python shows the lines of syntax errors from the file if it exists.
+        controller_loader.compile_controller(source, file_path)
+
+        # Anything the controller prints during the check is discarded
+        with contextlib.redirect_stdout(ControllerOutput()):
+            module = controller_loader.load_controller(source, file_path)
+
+        controller_class = getattr(module, "CustomController", None)
+        if not inspect.isclass(controller_class):
+            raise AttributeError("The controller file does not define a class named CustomController.")
+        check_signature(controller_class.__init__, "__init__(self, state)", 1)
+        check_signature(getattr(controller_class, "step", None), "step(self)", 0)
+
+        # A few steps of the controller against a simulated state, in the same order as in a simulation
+        simulator = SimulatorStub()
+        state = state_layer.State(simulator)
+        state.update()
+        with contextlib.redirect_stdout(ControllerOutput()):
+            controller = controller_class(state)
+            for _ in range(dry_run_steps):
+                supervisor.step_started()
+                controller.step()
+                supervisor.step_finished()
+                state.flush()
+                simulator.SE_StepDT(0.1)
+                state.update()
+    except Exception as e:
+        return controller_loader.portable_exception(e)
+    return None
+
+# The check in the form of a simulation result, for running it in a supervised worker process
+def run_check(file_path="custom_controller.py", source=None):
+    error = check_controller(file_path, source=source)
+    return ("error", error, None) if error is not None else ("success", "", None)
+
+# Raises a TypeError if the method can't be called with the given number of arguments besides self
+def check_signature(method, description, number_of_arguments):
+    if not callable(method):
+        raise TypeError(f"CustomController has no method {description}.")
+    try:
+        inspect.signature(method).bind(None, *[None] * number_of_arguments)
+    except TypeError:
+        raise TypeError(f"CustomController.{description.split('(')[0]} must have the signature {description}.")
+    except ValueError:
+        # Built-in methods without a signature, e.g. the default __init__, are not checked
+        pass
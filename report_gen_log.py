@@ -2,6 +2,17 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import os
+import re
+import time
+import tracemalloc
+
+import trajectory_log
+
+# Per vehicle columns which are read as text and stripped of the padding Esmini adds. Other columns used by the checks are read as numbers.
+STRING_COLUMNS = ("collision_ids", "Entity_Name [-]")
+
+# Toggle for measuring the peak memory while parsing logs. Tracing the allocations makes the parsing several times slower.
+MEASURE_PEAK_MEMORY = False
 
 def detect_collisions_dynamic():
     """Checks for collisions involving the Ego vehicle and returns pass/fail status along with a message."""
@@ -29,6 +40,8 @@ def detect_collisions_dynamic():
             return (True, "No collisions were detected.", collision_frames)
 
     check.name = "detect_collisions_dynamic"
+    check.arguments = ()
+    check.columns = ["Index [-]", "TimeStamp [s]", "#1 Current_Speed [m/s]", "#1 collision_ids", "#* Entity_Name [-]"]
     return check
 def max_ego_speed(limit):
     """Factory function to create a check function with a specified speed limit."""
@@ -44,6 +57,8 @@ def max_ego_speed(limit):
         else:
             return (True, f"Maximum speed of Ego: {max_speed:.2f} m/s at time: {time} s, within the limit of {limit} m/s.")
     check.name = "max_ego_speed"
+    check.arguments = (limit,)
+    check.columns = ["TimeStamp [s]", "#1 Current_Speed [m/s]"]
     return check
 
 def min_ego_speed(limit):
@@ -60,6 +75,8 @@ def min_ego_speed(limit):
         else:
             return (True, f"Minimum speed of Ego: {min_speed:.2f} m/s at time: {time} s, above the minimum limit of {limit} m/s.")
     check.name = "min_ego_speed"
+    check.arguments = (limit,)
+    check.columns = ["TimeStamp [s]", "#1 Current_Speed [m/s]"]
     return check
     
 def greatest_ego_speed_increase(min_increase):
@@ -84,14 +101,17 @@ def greatest_ego_speed_increase(min_increase):
         else:
             return (True, f"Greatest speed increase of Ego after reaching its minimum speed: {greatest_increase:.2f} m/s, from time: {time_min_speed} s to {time_max_speed_after_min} s, meeting the required increase of {min_increase} m/s.")
     check.name = "greatest_ego_speed_increase"
+    check.arguments = (min_increase,)
+    check.columns = ["TimeStamp [s]", "#1 Current_Speed [m/s]"]
     return check
 
 def greatest_road_offset(max_allowed_offset):
     """Factory function to create a check function with a specified maximum allowed absolute offset from middle of the road."""
-    def check(df):
+    def check(df, derived=None):
         """The actual check function that will be called by generate_report."""
+        derived = compute_derived(df, derived, check)
         # Use absolute values to find the greatest offset
-        abs_offsets = df["#1 Lateral_Distance_Lanem [m]"].abs()
+        abs_offsets = derived["abs_lane_offset"]
         idx_max_abs_offset = abs_offsets.idxmax()
         max_abs_offset = abs_offsets[idx_max_abs_offset]
         time_max_offset = df.loc[idx_max_abs_offset, "TimeStamp [s]"]
@@ -101,14 +121,18 @@ def greatest_road_offset(max_allowed_offset):
         else:
             return (True, f"Greatest absolute lane offset of Ego: {max_abs_offset:.2f} m at time: {time_max_offset} s, within the allowed maximum of {max_allowed_offset} m.")
     check.name = "greatest_lane_offset"
+    check.arguments = (max_allowed_offset,)
+    check.columns = ["TimeStamp [s]"]
+    check.requires = ["abs_lane_offset"]
     return check
 
 def smallest_road_offset(min_allowed_offset):
     """Factory function to create a check function with a specified minimum allowed absolute lane offset from middle of the road."""
-    def check(df):
+    def check(df, derived=None):
         """The actual check function that will be called by generate_report."""
+        derived = compute_derived(df, derived, check)
         # Use absolute values to find the offset closest to zero
-        abs_offsets = df["#1 Lateral_Distance_Lanem [m]"].abs()
+        abs_offsets = derived["abs_lane_offset"]
         idx_min_abs_offset = abs_offsets.idxmin()
         min_abs_offset = abs_offsets[idx_min_abs_offset]
         time_min_offset = df.loc[idx_min_abs_offset, "TimeStamp [s]"]
@@ -118,9 +142,11 @@ def smallest_road_offset(min_allowed_offset):
         else:
             return (True, f"Smallest absolute lane offset of Ego: {min_abs_offset:.2f} m at time: {time_min_offset} s, above the allowed minimum of {min_allowed_offset} m.")
     check.name = "smallest_lane_offset"
+    check.arguments = (min_allowed_offset,)
+    check.columns = ["TimeStamp [s]"]
+    check.requires = ["abs_lane_offset"]
     return check
 
-import re
 # This code gets the numbers of the vehicles in the dataframe
 def get_vehicle_identifiers(df):
     """Extracts unique vehicle identifiers from dataframe column names using regex."""
@@ -145,46 +171,244 @@ def calculate_distance(row, other_prefix, ego_prefix="#1",):
     return float('inf')  # Return infinity if not in the same lane or not ahead
 
 
+def same_lane_gaps(df, vehicle_ids, ego_prefix="#1"):
+    """Vectorized version of calculate_distance for several vehicles at once. 
+    Returns a (frames x vehicles) matrix with the distance from the Ego vehicle to each vehicle ahead of it in the same lane, infinity otherwise."""
+    ego_lane = df[f"{ego_prefix} lane_id"].to_numpy()[:, np.newaxis]
+    ego_s = df[f"{ego_prefix} Distance_Travelled_Along_Road_Segment [m]"].to_numpy(dtype=float)[:, np.newaxis]
+    lanes = df[[f"#{vid} lane_id" for vid in vehicle_ids]].to_numpy()
+    s = df[[f"#{vid} Distance_Travelled_Along_Road_Segment [m]" for vid in vehicle_ids]].to_numpy(dtype=float)
+
+    gaps = s - ego_s
+    return np.where((lanes == ego_lane) & (gaps > 0), gaps, np.inf)
+
 def closest_distance_to_any_vehicle(min_allowed_distance):
     """Factory function to create a check function with a specified minimum allowed distance to any vehicle."""
-    def check(df):
+    def check(df, derived=None):
         """The actual check function that will be called by generate_report."""
-        vehicle_ids = get_vehicle_identifiers(df)
-        closest_distance = float('inf')
-        closest_time = None
-        closest_vehicle_id = None
-
-        for vid in vehicle_ids[1:]:  # Start from 2 to exclude Ego itself
-            prefix = f"#{vid}"
-            distances = df.apply(lambda row: calculate_distance(row, prefix), axis=1)
-            min_distance_index = distances.idxmin()
-            if distances[min_distance_index] < closest_distance:
-                closest_distance = distances[min_distance_index]
-                closest_time = df.loc[min_distance_index, "TimeStamp [s]"]
-                closest_vehicle_id = vid
+        derived = compute_derived(df, derived, check)
+        vehicle_ids = derived["other_vehicle_ids"]
+        if not vehicle_ids:
+            return (True, "No other vehicles present or no distances calculated.")
+
+        gaps = derived["same_lane_gaps"]
+        # The first vehicle and the first frame are chosen when several share the smallest distance
+        closest_vehicles_distances = gaps.min(axis=0)
+        closest_vehicle_index = np.argmin(closest_vehicles_distances)
+        closest_distance = closest_vehicles_distances[closest_vehicle_index]
 
         if closest_distance == float('inf'):
             return (True, "No other vehicles present or no distances calculated.")
 
+        closest_time = df["TimeStamp [s]"].iloc[np.argmin(gaps[:, closest_vehicle_index])]
+        closest_vehicle_id = vehicle_ids[closest_vehicle_index]
+
         if closest_distance < min_allowed_distance:
             return (False, f"Closest distance Ego comes to any vehicle is {closest_distance:.2f} m to vehicle #{closest_vehicle_id} at time: {closest_time} s, which is closer than the allowed minimum of {min_allowed_distance} m.")
         else:
             return (True, f"Closest distance Ego comes to any vehicle is {closest_distance:.2f} m to vehicle #{closest_vehicle_id} at time: {closest_time} s, respecting the minimum allowed distance of {min_allowed_distance} m.")
         
     check.name = "closest_distance_to_any_vehicle"
+    check.arguments = (min_allowed_distance,)
+    check.columns = ["TimeStamp [s]"]
+    check.requires = ["other_vehicle_ids", "same_lane_gaps"]
+    return check
+
+def min_time_to_collision(min_allowed_ttc):
+    """Factory function to create a check function with a specified minimum allowed time to collision with any vehicle ahead in the same lane."""
+    def check(df, derived=None):
+        """The actual check function that will be called by generate_report."""
+        derived = compute_derived(df, derived, check)
+        vehicle_ids = derived["other_vehicle_ids"]
+        ttc = derived["time_to_collision"]
+        if not vehicle_ids or np.isinf(ttc).all():
+            return (True, "Ego never approached a vehicle ahead in the same lane.")
+
+        frame_index, vehicle_index = np.unravel_index(np.argmin(ttc), ttc.shape)
+        smallest_ttc = ttc[frame_index, vehicle_index]
+        time = df["TimeStamp [s]"].iloc[frame_index]
+        vehicle_id = vehicle_ids[vehicle_index]
+
+        if smallest_ttc < min_allowed_ttc:
+            return (False, f"Smallest time to collision of Ego: {smallest_ttc:.2f} s to vehicle #{vehicle_id} at time: {time} s, which is below the allowed minimum of {min_allowed_ttc} s.")
+        else:
+            return (True, f"Smallest time to collision of Ego: {smallest_ttc:.2f} s to vehicle #{vehicle_id} at time: {time} s, above the allowed minimum of {min_allowed_ttc} s.")
+    check.name = "min_time_to_collision"
+    check.arguments = (min_allowed_ttc,)
+    check.columns = ["TimeStamp [s]"]
+    check.requires = ["other_vehicle_ids", "time_to_collision"]
     return check
 
-# Function which accepts a set of tests which it will run on the linked csv log. Returns a list of dictionaries with the reults from the tests
+"""Derived quantities shared by the checks. 
+Each check lists the quantities it uses in check.requires. generate_report computes every quantity needed by its checks once, 
+in an order where the dependencies of a quantity come before it, and passes them to all checks."""
+
+def derive_abs_lane_offset(df, derived):
+    return df["#1 Lateral_Distance_Lanem [m]"].abs()
+
+def derive_other_vehicle_ids(df, derived):
+    return get_vehicle_identifiers(df)[1:]  # Start from 2 to exclude Ego itself
+
+def derive_same_lane_gaps(df, derived):
+    return same_lane_gaps(df, derived["other_vehicle_ids"])
+
+def derive_relative_speed(df, derived):
+    # How fast Ego approaches each other vehicle along the road, as a (frames x vehicles) matrix. Negative when the other vehicle is faster.
+    ego_speed = df["#1 Current_Speed [m/s]"].to_numpy(dtype=float)[:, np.newaxis]
+    speeds = df[[f"#{vid} Current_Speed [m/s]" for vid in derived["other_vehicle_ids"]]].to_numpy(dtype=float)
+    return ego_speed - speeds
+
+def derive_time_to_collision(df, derived):
+    # Time until Ego reaches each vehicle ahead of it in the same lane at the current speeds, infinity if it never does
+    gaps = derived["same_lane_gaps"]
+    relative_speed = derived["relative_speed"]
+    approaching = np.isfinite(gaps) & (relative_speed > 0)
+    return np.divide(gaps, relative_speed, out=np.full(gaps.shape, np.inf), where=approaching)
+
+# Name: (derived quantities it depends on, columns it reads, function computing it)
+DERIVED_QUANTITIES = {
+    "abs_lane_offset": ([], ["#1 Lateral_Distance_Lanem [m]"], derive_abs_lane_offset),
+    "other_vehicle_ids": ([], [], derive_other_vehicle_ids),
+    "same_lane_gaps": (["other_vehicle_ids"], ["#* lane_id", "#* Distance_Travelled_Along_Road_Segment [m]"], derive_same_lane_gaps),
+    "relative_speed": (["other_vehicle_ids"], ["#* Current_Speed [m/s]"], derive_relative_speed),
+    "time_to_collision": (["same_lane_gaps", "relative_speed"], [], derive_time_to_collision),
+}
+
+# Returns the names of the derived quantities needed by the checks, ordered so that dependencies are computed first
+def build_plan(checks):
+    plan = []
+    def add(name):
+        if name in plan:
+            return
+        for dependency in DERIVED_QUANTITIES[name][0]:
+            add(dependency)
+        plan.append(name)
+
+    for check_func in checks:
+        for name in getattr(check_func, "requires", []):
+            add(name)
+    return plan
+
+def execute_plan(df, plan):
+    derived = {}
+    for name in plan:
+        derived[name] = DERIVED_QUANTITIES[name][2](df, derived)
+    return derived
+
+# Lets a check be called on its own, without quantities derived by generate_report
+def compute_derived(df, derived, check_func):
+    if derived is None:
+        derived = execute_plan(df, build_plan([check_func]))
+    return derived
+
+# Checks declare the columns they use in check.columns, where "#*" stands for the prefix of every vehicle. 
+# Returns None if any of the checks does not declare its columns, meaning that all columns are needed.
+def required_columns(checks):
+    columns = set()
+    for check_func in checks:
+        check_columns = getattr(check_func, "columns", None)
+        if check_columns is None:
+            return None
+        columns.update(check_columns)
+    # The columns read by the derived quantities the checks use
+    for name in build_plan(checks):
+        columns.update(DERIVED_QUANTITIES[name][1])
+    return columns
+
+def column_matches(column, pattern):
+    if pattern.startswith("#*"):
+        return re.fullmatch(r"#\d+" + re.escape(pattern[2:]), column) is not None
+    return column == pattern
+
+# Loads an Esmini CSV log with only the columns needed by the checks. Returns the dataframe and statistics about the parsing.
+def load_log(file_path, checks=None, engine="c", measure_memory=MEASURE_PEAK_MEMORY):
+    """Reads the columns used by the checks with explicit types and strips the padding of the text columns."""
+    start_time = time.perf_counter()
+    # Peak memory is only measured if no one else is already tracing memory allocations
+    measure_memory = measure_memory and not tracemalloc.is_tracing()
+    if measure_memory:
+        tracemalloc.start()
+
+    # The header line is read on its own to find the columns to keep. The column names are padded with spaces in the file.
+    with open(file_path) as file:
+        for _ in range(6):
+            file.readline()
+        file_columns = file.readline().rstrip("\n").split(",")
+    patterns = required_columns(checks) if checks is not None else None
+    if patterns is None:
+        df = pd.read_csv(file_path, skiprows=6, engine=engine)
+        df.columns = df.columns.str.strip()
+        df = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
+    else:
+        use_columns = [column for column in file_columns if any(column_matches(column.strip(), pattern) for pattern in patterns)]
+        dtypes = {}
+        for column in use_columns:
+            if column.strip().endswith(STRING_COLUMNS):
+                dtypes[column] = str
+            elif column.strip() == "Index [-]":
+                dtypes[column] = "int64"
+            else:
+                dtypes[column] = "float64"
+        df = pd.read_csv(file_path, skiprows=6, usecols=use_columns, dtype=dtypes, engine=engine)
+        df.columns = df.columns.str.strip()
+        for column in df.columns:
+            if column.endswith(STRING_COLUMNS):
+                df[column] = df[column].fillna("").str.strip()
+
+    stats = {
+        "columns_read": len(df.columns),
+        "columns_total": len(file_columns),
+        "parse_time_ms": (time.perf_counter() - start_time) * 1000,
+        "dataframe_memory_mb": float(df.memory_usage(deep=True).sum()) / (1024 * 1024),
+        "peak_memory_mb": None
+    }
+    if measure_memory:
+        stats["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return df, stats
+
+# Loads a binary trajectory log as a dataframe with the same columns and values as the CSV log, limited to the columns needed by the checks
+def load_trajectory(file_path, checks=None):
+    start_time = time.perf_counter()
+    steps, header = trajectory_log.read_trajectory(file_path)
+    all_columns = trajectory_log.trajectory_columns(header)
+    patterns = required_columns(checks) if checks is not None else None
+    if patterns is None:
+        use_columns = all_columns
+    else:
+        use_columns = [column for column in all_columns if any(column_matches(column, pattern) for pattern in patterns)]
+    df = pd.DataFrame({column: trajectory_log.trajectory_column(steps, header, column) for column in use_columns})
+
+    stats = {
+        "columns_read": len(df.columns),
+        "columns_total": len(all_columns),
+        "parse_time_ms": (time.perf_counter() - start_time) * 1000,
+        "dataframe_memory_mb": float(df.memory_usage(deep=True).sum()) / (1024 * 1024),
+        "peak_memory_mb": None
+    }
+    return df, stats
+
+# Function which accepts a set of tests which it will run on the linked log, a binary trajectory log (.npy) or a CSV log. Returns a list of dictionaries with the reults from the tests
 def generate_report(checks, file_path):
     """Executes a list of checks on the dataset and compiles the results into a list of of dictionaries (fucntion name, pass/fail, message)."""
-    df = pd.read_csv(file_path, skiprows=6)
-    df.columns = df.columns.str.strip()
-    df = df.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
+    if file_path.endswith(".npy"):
+        df, stats = load_trajectory(file_path, checks)
+    else:
+        df, stats = load_log(file_path, checks)
+    peak_memory = f", peak memory {stats['peak_memory_mb']:.1f} MB" if stats["peak_memory_mb"] is not None else ""
+    print(f"Parsed {file_path}: {stats['columns_read']} of {stats['columns_total']} columns in {stats['parse_time_ms']:.1f} ms, {stats['dataframe_memory_mb']:.1f} MB{peak_memory}")
+
+    # Derived quantities are computed once and shared by all checks
+    derived = execute_plan(df, build_plan(checks))
 
     crash_frames = []
     report_results = []
     for check_func in checks:
-        result = check_func(df)
+        # Checks which do not use derived quantities only take the dataframe
+        if hasattr(check_func, "requires"):
+            result = check_func(df, derived)
+        else:
+            result = check_func(df)
 
         if check_func.name == "detect_collisions_dynamic":
             crash_frames = result[2]
@@ -0,0 +1,273 @@
+"""Incremental versions of the checks in report_gen_log, evaluated on the state of each simulation step instead of the CSV log.
+Each online check keeps running accumulators and produces the same result as its counterpart once the simulation is over.
+A check is finished when its verdict can't change anymore, e.g. after a collision, and the simulation can then end early."""
+
+import math
+
+# Esmini writes the CSV log with three decimals, values are rounded the same way to give the same messages
+def rounded(value):
+    return round(float(value), 3)
+
+
+class DetectCollisions:
+    def __init__(self):
+        self.collision_frames = []
+        self.collision_messages = []
+        self.latest_collision = -1
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        collisions = state.get_collisions(0)
+        if not collisions:
+            return
+        self.collision_frames.append(frame)
+        # Assuming there is only one colliding entity, as in the CSV based check
+        if time > self.latest_collision + 1:
+            self.latest_collision = time
+            colliding_name = state.get_name(collisions[0])
+            self.collision_messages.append(f"Ego was involved in a collision at time: {time} s with a speed of {rounded(state.vehicles[0].speed)} m/s, colliding with: {colliding_name}.")
+        # A collision makes the check fail regardless of what happens later
+        self.finished = True
+
+    def result(self):
+        if self.collision_frames:
+            return (False, "\n".join(self.collision_messages), self.collision_frames)
+        return (True, "No collisions were detected.", self.collision_frames)
+
+
+class MaxEgoSpeed:
+    def __init__(self, limit):
+        self.limit = limit
+        self.max_speed = -math.inf
+        self.time = None
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        speed = rounded(state.vehicles[0].speed)
+        if speed > self.max_speed:
+            self.max_speed = speed
+            self.time = time
+        self.finished = self.max_speed > self.limit
+
+    def result(self):
+        if self.max_speed > self.limit:
+            return (False, f"Maximum speed of Ego: {self.max_speed:.2f} m/s at time: {self.time} s, which exceeds the limit of {self.limit} m/s.")
+        else:
+            return (True, f"Maximum speed of Ego: {self.max_speed:.2f} m/s at time: {self.time} s, within the limit of {self.limit} m/s.")
+
+
+class MinEgoSpeed:
+    def __init__(self, limit):
+        self.limit = limit
+        self.min_speed = math.inf
+        self.time = None
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        speed = rounded(state.vehicles[0].speed)
+        if speed < self.min_speed:
+            self.min_speed = speed
+            self.time = time
+        self.finished = self.min_speed < self.limit
+
+    def result(self):
+        if self.min_speed < self.limit:
+            return (False, f"Minimum speed of Ego: {self.min_speed:.2f} m/s at time: {self.time} s, which is below the minimum limit of {self.limit} m/s.")
+        else:
+            return (True, f"Minimum speed of Ego: {self.min_speed:.2f} m/s at time: {self.time} s, above the minimum limit of {self.limit} m/s.")
+
+
+class GreatestEgoSpeedIncrease:
+    def __init__(self, min_increase):
+        self.min_increase = min_increase
+        self.min_speed = math.inf
+        self.time_min_speed = None
+        # Greatest speed since the minimum speed was reached
+        self.max_speed_after_min = -math.inf
+        self.time_max_speed_after_min = None
+        self.min_is_last = False
+        # A later minimum can always change the verdict
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        speed = rounded(state.vehicles[0].speed)
+        self.min_is_last = False
+        if speed < self.min_speed:
+            self.min_speed = speed
+            self.time_min_speed = time
+            self.max_speed_after_min = speed
+            self.time_max_speed_after_min = time
+            self.min_is_last = True
+        elif speed > self.max_speed_after_min:
+            self.max_speed_after_min = speed
+            self.time_max_speed_after_min = time
+
+    def result(self):
+        if self.min_is_last:
+            return (False, "No increase in speed detected after reaching the minimum speed.")
+
+        greatest_increase = self.max_speed_after_min - self.min_speed
+        if greatest_increase < self.min_increase:
+            return (False, f"Greatest speed increase of Ego after reaching its minimum speed is {greatest_increase:.2f} m/s, from time: {self.time_min_speed} s to {self.time_max_speed_after_min} s, which is less than the required increase of {self.min_increase} m/s.")
+        else:
+            return (True, f"Greatest speed increase of Ego after reaching its minimum speed: {greatest_increase:.2f} m/s, from time: {self.time_min_speed} s to {self.time_max_speed_after_min} s, meeting the required increase of {self.min_increase} m/s.")
+
+
+class GreatestRoadOffset:
+    def __init__(self, max_allowed_offset):
+        self.max_allowed_offset = max_allowed_offset
+        self.max_abs_offset = -math.inf
+        self.time = None
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        abs_offset = abs(rounded(state.vehicles[0].t))
+        if abs_offset > self.max_abs_offset:
+            self.max_abs_offset = abs_offset
+            self.time = time
+        self.finished = self.max_abs_offset > self.max_allowed_offset
+
+    def result(self):
+        if self.max_abs_offset > self.max_allowed_offset:
+            return (False, f"Greatest absolute lane offset of Ego: {self.max_abs_offset:.2f} m at time: {self.time} s, which exceeds the allowed maximum of {self.max_allowed_offset} m.")
+        else:
+            return (True, f"Greatest absolute lane offset of Ego: {self.max_abs_offset:.2f} m at time: {self.time} s, within the allowed maximum of {self.max_allowed_offset} m.")
+
+
+class SmallestRoadOffset:
+    def __init__(self, min_allowed_offset):
+        self.min_allowed_offset = min_allowed_offset
+        self.min_abs_offset = math.inf
+        self.time = None
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        abs_offset = abs(rounded(state.vehicles[0].t))
+        if abs_offset < self.min_abs_offset:
+            self.min_abs_offset = abs_offset
+            self.time = time
+        self.finished = self.min_abs_offset < self.min_allowed_offset
+
+    def result(self):
+        if self.min_abs_offset < self.min_allowed_offset:
+            return (False, f"Smallest absolute lane offset of Ego: {self.min_abs_offset:.2f} m at time: {self.time} s, which is below the allowed minimum of {self.min_allowed_offset} m.")
+        else:
+            return (True, f"Smallest absolute lane offset of Ego: {self.min_abs_offset:.2f} m at time: {self.time} s, above the allowed minimum of {self.min_allowed_offset} m.")
+
+
+# Distances and relative speeds to the vehicles ahead of Ego in its lane, as (vehicle number, distance, relative speed). Vehicle number 2 is the first vehicle after Ego.
+# The vehicles are looked up in the lane index of the state, which the controller queries in the same step. 
+# They are returned in the order of their numbers, so that ties are resolved like in the CSV based checks.
+def vehicles_ahead(state):
+    ego = state.vehicles[0]
+    ego_s = rounded(ego.s)
+    ahead = []
+    for vehicle_index, vehicle in state.vehicles_ahead(0):
+        s = rounded(vehicle.s)
+        # Vehicles less than a millimetre ahead have the same rounded s as Ego, as in the CSV log
+        if s > ego_s:
+            ahead.append((vehicle_index + 1, s - ego_s, rounded(ego.speed) - rounded(vehicle.speed)))
+    return sorted(ahead)
+
+
+class ClosestDistanceToAnyVehicle:
+    def __init__(self, min_allowed_distance):
+        self.min_allowed_distance = min_allowed_distance
+        # Smallest distance to each vehicle and the first time it occurred, the vehicle with the lowest number wins ties like in the CSV based check
+        self.closest = {}
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        for number, distance, _ in vehicles_ahead(state):
+            if number not in self.closest or distance < self.closest[number][0]:
+                self.closest[number] = (distance, time)
+                if distance < self.min_allowed_distance:
+                    self.finished = True
+
+    def result(self):
+        if not self.closest:
+            return (True, "No other vehicles present or no distances calculated.")
+
+        closest_vehicle_id = min(self.closest, key=lambda number: (self.closest[number][0], number))
+        closest_distance, closest_time = self.closest[closest_vehicle_id]
+        if closest_distance < self.min_allowed_distance:
+            return (False, f"Closest distance Ego comes to any vehicle is {closest_distance:.2f} m to vehicle #{closest_vehicle_id} at time: {closest_time} s, which is closer than the allowed minimum of {self.min_allowed_distance} m.")
+        else:
+            return (True, f"Closest distance Ego comes to any vehicle is {closest_distance:.2f} m to vehicle #{closest_vehicle_id} at time: {closest_time} s, respecting the minimum allowed distance of {self.min_allowed_distance} m.")
+
+
+class MinTimeToCollision:
+    def __init__(self, min_allowed_ttc):
+        self.min_allowed_ttc = min_allowed_ttc
+        self.smallest_ttc = math.inf
+        self.vehicle_id = None
+        self.time = None
+        self.finished = False
+
+    def observe(self, frame, time, state):
+        for number, distance, relative_speed in vehicles_ahead(state):
+            if relative_speed > 0 and distance / relative_speed < self.smallest_ttc:
+                self.smallest_ttc = distance / relative_speed
+                self.vehicle_id = number
+                self.time = time
+        self.finished = self.smallest_ttc < self.min_allowed_ttc
+
+    def result(self):
+        if self.vehicle_id is None:
+            return (True, "Ego never approached a vehicle ahead in the same lane.")
+        if self.smallest_ttc < self.min_allowed_ttc:
+            return (False, f"Smallest time to collision of Ego: {self.smallest_ttc:.2f} s to vehicle #{self.vehicle_id} at time: {self.time} s, which is below the allowed minimum of {self.min_allowed_ttc} s.")
+        else:
+            return (True, f"Smallest time to collision of Ego: {self.smallest_ttc:.2f} s to vehicle #{self.vehicle_id} at time: {self.time} s, above the allowed minimum of {self.min_allowed_ttc} s.")
+
+
+# The online version of each check in report_gen_log, by check name
+ONLINE_CHECKS = {
+    "detect_collisions_dynamic": DetectCollisions,
+    "max_ego_speed": MaxEgoSpeed,
+    "min_ego_speed": MinEgoSpeed,
+    "greatest_ego_speed_increase": GreatestEgoSpeedIncrease,
+    "greatest_lane_offset": GreatestRoadOffset,
+    "smallest_lane_offset": SmallestRoadOffset,
+    "closest_distance_to_any_vehicle": ClosestDistanceToAnyVehicle,
+    "min_time_to_collision": MinTimeToCollision,
+}
+
+# Checks are identified by name and factory arguments, which unlike the check functions can be sent to worker processes
+def check_specs(checks):
+    return [(check.name, check.arguments) for check in checks]
+
+def supports_online(checks):
+    return all(getattr(check, "name", None) in ONLINE_CHECKS and hasattr(check, "arguments") for check in checks)
+
+
+class OnlineReport:
+    def __init__(self, specs):
+        self.names = [name for name, _ in specs]
+        self.checks = [ONLINE_CHECKS[name](*arguments) for name, arguments in specs]
+        self.frame = 0
+        # Set by the simulation loop if it ended the simulation early. The trajectory log is then too short for other checks.
+        self.stopped_early = False
+
+    # Called with the updated state once per simulation step
+    def observe(self, state, time):
+        time = rounded(time)
+        for check in self.checks:
+            check.observe(self.frame, time, state)
+        self.frame += 1
+
+    @property
+    def finished(self):
+        # The verdicts of all checks are fixed, so simulating further can't change whether the scenario passes
+        return all(check.finished for check in self.checks)
+
+    # Returns the results in the same form as report_gen_log.generate_report
+    def results(self):
+        crash_frames = []
+        report_results = []
+        for name, check in zip(self.names, self.checks):
+            result = check.result()
+            if name == "detect_collisions_dynamic":
+                crash_frames = result[2]
+            report_results.append({"check_function": name, "success": result[0], "message": result[1]})
+        return report_results, crash_frames
@@ -1,35 +1,72 @@
 from radon.visitors import ComplexityVisitor
 from radon.metrics import mi_visit, mi_rank
 from radon.raw import analyze
-import subprocess
-import sys
+from flake8.api import legacy as flake8_api
+from flake8.formatting.base import BaseFormatter
+import hashlib
+import os
+import threading
+
+# Results of static_analysis by file path and content hash, so each version of the controller is analysed once
+analysis_cache = {}
+
+# The flake8 style guide is set up once per process, as loading the plugins takes most of the time of a check.
+# It holds the formatter of the current check, so checks from several threads are made one at a time.
+style_guide = None
+style_guide_lock = threading.Lock()
 
 def static_analysis_string(file_path, iteration, task, create_new_controller, use_vision_api):
-    code_analysis = analyze_code(file_path)
+    analysis = static_analysis(file_path)
+    code_analysis = analysis["code_analysis"]
     pep8_analysis = pep_report(file_path)
-    pep8_issues = check_pep8(file_path)
+    pep8_issues = analysis["pep8_issues"]
     return f"Static Code analysis for iteration {iteration}: \ntask: {task}, new controller: {create_new_controller}, vision: {use_vision_api} \ncode_analysis: {code_analysis} \npep8_analysis: {pep8_analysis} \npep8_issues: {pep8_issues}\n\n"
 
 def static_analysis_json(file_path):
-    code_analysis = analyze_code(file_path)
+    code_analysis = static_analysis(file_path)["code_analysis"]
     pep8_analysis = pep_report(file_path)
     return {
         "code_complexity": code_analysis["average_complexity"],
         "code_maintainability_score": code_analysis["maintainability_score"],
-        "code_density": code_analysis["code_density"], 
-        "pep8_errors": pep8_analysis["errors"], 
+        "code_density": code_analysis["code_density"],
+        "pep8_errors": pep8_analysis["errors"],
         "pep8_warnings": pep8_analysis["warnings"]
     }
 
-# Analyses the controller code using libraries
+# Runs radon and flake8 on the file in this process and returns both results. Repeated calls for unchanged content return the stored result.
+def static_analysis(file_path):
+    with open(file_path, "rb") as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+    key = (file_path, content_hash)
+    if key not in analysis_cache:
+        analysis_cache[key] = {
+            "code_analysis": analyze_code(file_path),
+            "pep8_issues": run_flake8(file_path)
+        }
+    return analysis_cache[key]
+
+# Analyses the controller code using libraries. Code which can't be parsed gets no metrics, 
+# its syntax error is reported once for the scenario set by the pre-flight check.
 def analyze_code(file_path):
     # Load file to be analyzed
     with open(file_path) as f:
         source_code = f.read()
 
+    try:
+        return code_metrics(source_code)
+    except SyntaxError as e:
+        return {
+            "average_complexity": None,
+            "maintainability_score": None,
+            "maintainability_grade": None,
+            "code_density": None,
+            "parse_error": f"The code could not be parsed: {e}"
+        }
+
+def code_metrics(source_code):
     # Analyze the raw metrics needed for MI calculation
     raw_metrics = analyze(source_code)
-    
+
     # Calculate Maintainability Index without considering comments
     mi_score = mi_visit(source_code, raw_metrics.multi)
     # Translate the numerical score into a grade
@@ -41,7 +78,7 @@ def analyze_code(file_path):
     else:
         code_density = 0
 
-    # Analyze the complexity of the functions and methods in the file. 
+    # Analyze the complexity of the functions and methods in the file.
     visitor = ComplexityVisitor.from_code(source_code)
     # Score Accumulator for finding the average.
     complexity_scores = [method.complexity for cls in visitor.classes for method in cls.methods]
@@ -56,27 +93,43 @@ def analyze_code(file_path):
         "code_density": code_density
     }
 
-def check_pep8(file_path):
+# Checks the file with flake8 through its API. Issues are given in the same form as on the command line,
+# and are errors if their code is a pycodestyle error (E) and warnings otherwise.
+# Issues name the file without its folder, so the feedback to the LLM is the same wherever the controller is saved.
+def run_flake8(file_path):
+    global style_guide
+    violations = []
+
+    # Collects the violations instead of printing them
+    class ViolationCollector(BaseFormatter):
+        def handle(self, error):
+            violations.append(error)
+
     try:
-        result = subprocess.run([sys.executable, '-m', 'flake8', file_path], text=True, capture_output=True)
-        
-        if result.returncode == 0:
-            return {"errors": [], "warnings": []}
-        else:
-            errors = []
-            warnings = []
-            issues = result.stdout.strip().split('\n')
-            for issue in issues:
-                if issue.startswith('E'):
-                    errors.append(issue)
-                else:
-                    warnings.append(issue)
-            return {"errors": errors, "warnings": warnings}
+        with style_guide_lock:
+            if style_guide is None:
+                style_guide = flake8_api.get_style_guide()
+            style_guide.init_report(ViolationCollector)
+            style_guide.check_files([file_path])
     except Exception as e:
         print(f"An error occurred while checking PEP 8 compliance: {e}")
         return None
-    
+
+    errors = []
+    warnings = []
+    for violation in sorted(violations, key=lambda violation: (violation.line_number, violation.column_number)):
+        issue = f"{os.path.basename(violation.filename)}:{violation.line_number}:{violation.column_number}: {violation.code} {violation.text}"
+        if violation.code.startswith('E'):
+            errors.append(issue)
+        else:
+            warnings.append(issue)
+    return {"errors": errors, "warnings": warnings}
+
+def check_pep8(file_path):
+    return static_analysis(file_path)["pep8_issues"]
+
 def pep_report(file_path):
     pep8_results = check_pep8(file_path)
+    if pep8_results is None:
+        return {"errors": None, "warnings": None}
     return {"errors": len(pep8_results["errors"]), "warnings": len(pep8_results["warnings"])}
-
@@ -1,74 +1,111 @@
-from PIL import Image
+from PIL import Image, ImageOps
 import os
-from openai import OpenAI
+import io
+from concurrent.futures import ThreadPoolExecutor
+import llm_backend
 import base64
 import numpy as np
 
+# Size in pixels of the images sent to the vision model. Larger screenshots are cropped to its aspect ratio around their centre and scaled down.
+IMAGE_SIZE = (768, 512)
 
-# Converts image formats and requests a report based on the them
-def generate_visual_report(crash_frame, task, iteration, scenario, run_path):
+# JPEG quality of the images sent to the vision model, from 1 to 95
+JPEG_QUALITY = 80
 
-    convert_TGA(crash_frame, iteration, scenario, run_path)
-    
-    report = analyze_images("screen_shots", task)
-    return report
+# Number of threads converting screenshots and writing their copies to the run folder
+IMAGE_THREADS = 4
 
-def convert_TGA(crash_frame, iteration, scenario, run_path):
-    # Set the source folder to the current working directory
-    source_folder = os.getcwd()
-    screen_shots_folder = os.path.join(source_folder, 'screen_shots')
-    # Ensure the screen_shots folder exists
-    os.makedirs(screen_shots_folder, exist_ok=True)
-    # Remove potential previous images in the folder.
-    remove_PNG(screen_shots_folder)
+# Number of requests to the vision model which may be waiting for an answer at the same time
+REQUEST_THREADS = 4
 
+# Thread pools shared by all reports of the process, created on first use
+image_executor = None
+request_executor = None
+
+
+# Converts image formats and requests a report based on the them.
+# frame_paths are the screenshots around the crash, as selected from the frame index of the simulation.
+def generate_visual_report(frame_paths, task, iteration, scenario, run_path, image_size=IMAGE_SIZE, jpeg_quality=JPEG_QUALITY):
+    return submit_visual_report(frame_paths, task, iteration, scenario, run_path, image_size, jpeg_quality).result()
+
+# Same as generate_visual_report, but only the conversion of the frames is done before returning.
+# The request to the vision model runs in the background and the returned future gives the report,
+# once the copies of the images in the run folder are written as well.
+# The frames can be deleted as soon as the function returns.
+def submit_visual_report(frame_paths, task, iteration, scenario, run_path, image_size=IMAGE_SIZE, jpeg_quality=JPEG_QUALITY):
+    global request_executor
+
+    (images, copies) = convert_TGA(frame_paths, iteration, scenario, run_path, image_size, jpeg_quality)
+
+    if request_executor is None:
+        request_executor = ThreadPoolExecutor(max_workers=REQUEST_THREADS, thread_name_prefix="vision_requests")
+    return request_executor.submit(analyze_images_and_wait, images, task, copies)
+
+def analyze_images_and_wait(images, task, copies):
+    try:
+        return analyze_images(images, task)
+    finally:
+        wait_for_copies(copies)
+
+# Converts the screenshots to JPEG images in memory, in parallel, and returns them in the order of frame_paths.
+# The copies in the run folder are written in the background. The futures of the writes are returned with the images, see wait_for_copies.
+def convert_TGA(frame_paths, iteration, scenario, run_path, image_size=IMAGE_SIZE, jpeg_quality=JPEG_QUALITY):
     # Define and ensure the new structured destination folder exists
     new_destination_folder = os.path.join(run_path, str(iteration), str(scenario))
     os.makedirs(new_destination_folder, exist_ok=True)
-    
-    frame_number = 0
-    for filename in os.listdir(source_folder):
-        if filename.endswith('.tga'):
-            frame_number += 1
-            original_path = os.path.join(source_folder, filename)
-            try:
-                with Image.open(original_path) as img:
-                    # Define the new filename, replacing the file extension
-                    new_filename = filename[:-4] + '.png'   
-                    # Check if the current frame is within the desired range
-                    if abs(frame_number - crash_frame) <= 1:
-                        # Save the image in the screen_shots folder
-                        img.save(os.path.join(screen_shots_folder, new_filename))
-                        # Additionally, save a copy in the new structured destination folder
-                        img.save(os.path.join(new_destination_folder, new_filename))
-            except Exception as e:
-                print(f"Failed to convert {filename}. Error: {e}")
-
-def remove_TGA():
-    source_folder = os.getcwd()
-    for filename in os.listdir(source_folder):
-        if filename.endswith('.tga'):
-            original_path = os.path.join(source_folder, filename)
-            os.remove(original_path)
-
-def remove_PNG(folder):
-    for filename in os.listdir(folder):
-        if filename.endswith('.png'):
-            original_path = os.path.join(folder, filename)
-            os.remove(original_path)
-
-def encode_image_to_base64(image_path):
-    """
-    Encodes an image to a base64 string.
 
-    :param image_path: Path to the image file.
-    :return: A base64 encoded string of the image.
-    """
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    executor = get_image_executor()
+    # Only the selected frames are opened, the other screenshots of the simulation are never decoded
+    conversions = [executor.submit(encode_frame, original_path, image_size, jpeg_quality) for original_path in frame_paths]
+    images = []
+    copies = []
+    for original_path, conversion in zip(frame_paths, conversions):
+        filename = os.path.basename(original_path)
+        try:
+            image = conversion.result()
+        except Exception as e:
+            print(f"Failed to convert {filename}. Error: {e}")
+            continue
+        images.append(image)
+        # The copy in the run folder is the image the vision model was given
+        new_filename = os.path.splitext(filename)[0] + '.jpg'
+        copies.append(executor.submit(write_image, os.path.join(new_destination_folder, new_filename), image))
+    return (images, copies)
+
+def get_image_executor():
+    global image_executor
+    if image_executor is None:
+        image_executor = ThreadPoolExecutor(max_workers=IMAGE_THREADS, thread_name_prefix="vision_images")
+    return image_executor
+
+# Decodes a screenshot, crops and scales it to image_size and returns it encoded as JPEG
+def encode_frame(image_path, image_size=IMAGE_SIZE, jpeg_quality=JPEG_QUALITY):
+    with Image.open(image_path) as img:
+        # JPEG has no alpha channel
+        img = img.convert("RGB")
+    if img.width >= image_size[0] and img.height >= image_size[1]:
+        img = ImageOps.fit(img, image_size, Image.Resampling.LANCZOS)
+    else:
+        # Smaller screenshots are only scaled down to fit, never up
+        img.thumbnail(image_size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+    return buffer.getvalue()
+
+def write_image(path, image):
+    with open(path, "wb") as file:
+        file.write(image)
+
+# Blocks until the given copies of converted images are written to the run folder
+def wait_for_copies(copies):
+    for copy in copies:
+        try:
+            copy.result()
+        except Exception as e:
+            print(f"Failed to save a copy of a screenshot. Error: {e}")
 
-# Sends images and text to LLM to generate commentary
-def analyze_images(folder_path, task_prompt):
+# Sends images and text to LLM to generate commentary. images are JPEG encoded screenshots.
+def analyze_images(images, task_prompt):
 
     vision_prompt = f"""These screenshots were captured because a collision was detected during the simulation run. 
 \nPlease try to give an explanation of what might have gone wrong in the images.
@@ -88,21 +125,19 @@ def analyze_images(folder_path, task_prompt):
             }
         ]
         
-    # Add all images in the folder to the message
-    for file_name in os.listdir(folder_path):
-        full_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(full_path) and file_name.lower().endswith(('.png', '.jpg', '.jpeg')):
-            base64_image = encode_image_to_base64(full_path)
-            content.append({
-                "type": "image_url",
-                "image_url": f"data:image/jpeg;base64,{base64_image}"
-            })
+    # Add the images to the message, in the order they were captured
+    for image in images:
+        base64_image = base64.b64encode(image).decode('utf-8')
+        content.append({
+            "type": "image_url",
+            "image_url": f"data:image/jpeg;base64,{base64_image}"
+        })
 
     system_prompt = """You are an expert at analyzing screenshots of traffic scenarios enacted in the Esmini simulator suite. The Esmini simulator is a minimalistic traffic simulator. Screenshots are captured and provided to you when there’s a fail state detected during the simulation. There is no guarantee that the failure is visible in the provided screenshot, so you should be clear if you can’t see what the issue might be. 
     You are going to provide descriptions of the scene and try to explain what it depicts. These natural language reports are going to be fed into another LLM, combined with other reports based on numerical logs, which will try to improve the code which controls the white car. Refer to the white car as “Ego” and distinguish it from the “non-controlled” car or cars. 
     """
 
-    client = OpenAI()
+    client = llm_backend.get_client()
     response = client.chat.completions.create(
         model="gpt-4-vision-preview",
         messages=[{"role": "system", "content": 
@@ -0,0 +1,147 @@
+import ast
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+"""Persistent cache of simulation results, keyed by the controller, the scenario and the Esmini arguments."""
+
+CACHE_FOLDER = "cache"
+TRAJECTORY_FILE_NAME = "trajectory.npy"
+ENTRY_FILE_NAME = "entry.json"
+
+# Suites run at the same time in a batch share the cache folder, so entries are written and evicted one at a time.
+# Reentrant, as put saves the new entry while holding it.
+write_lock = threading.RLock()
+
+
+class ResultCache:
+    def __init__(self, folder=CACHE_FOLDER, max_size_mb=500):
+        self.folder = folder
+        self.max_size = max_size_mb * 1024 * 1024
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get(self, key):
+        # Returns the cached entry for the key, or None if the combination has not been simulated before
+        entry = CacheEntry(os.path.join(self.folder, key))
+        if not entry.exists():
+            return None
+        # The modification time of the entry file is used to evict the least recently used entries first
+        os.utime(entry.entry_path)
+        return entry
+
+    def put(self, key, log_paths, run_result, message):
+        # Stores the log files of a finished simulation and returns the new entry
+        with write_lock:
+            self.evict(reserved_size=sum(os.path.getsize(log_path) for log_path in log_paths))
+            entry = CacheEntry(os.path.join(self.folder, key))
+            os.makedirs(entry.path, exist_ok=True)
+            for log_path in log_paths:
+                shutil.copy(log_path, os.path.join(entry.path, os.path.basename(log_path)))
+            entry.data = {"run_result": run_result, "message": str(message), "results": {}}
+            entry.save()
+        return entry
+
+    def evict(self, reserved_size=0):
+        # Removes the least recently used entries until the cache, and the reserved space for a new entry, is within the size limit
+        entries = []
+        total_size = reserved_size
+        for name in os.listdir(self.folder):
+            entry = CacheEntry(os.path.join(self.folder, name))
+            if not entry.exists():
+                continue
+            size = entry.size()
+            entries.append((os.path.getmtime(entry.entry_path), size, entry))
+            total_size += size
+
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total_size -= size
+
+
+class CacheEntry:
+    def __init__(self, path):
+        self.path = path
+        self.log_path = os.path.join(path, TRAJECTORY_FILE_NAME)
+        self.entry_path = os.path.join(path, ENTRY_FILE_NAME)
+        self.data = None
+
+    def exists(self):
+        return os.path.exists(self.entry_path) and os.path.exists(self.log_path)
+
+    def load(self):
+        if self.data is None:
+            with open(self.entry_path) as file:
+                self.data = json.load(file)
+        return self.data
+
+    def save(self):
+        with write_lock, open(self.entry_path, "w") as file:
+            json.dump(self.data, file, indent=2)
+
+    def log_paths(self):
+        return [os.path.join(self.path, name) for name in sorted(os.listdir(self.path)) if name != ENTRY_FILE_NAME]
+
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+    @property
+    def run_result(self):
+        return self.load()["run_result"]
+
+    @property
+    def message(self):
+        return self.load()["message"]
+
+    def get_results(self, checks):
+        # Returns (report_results, crash_frames) if the same checks were already run on the cached log, otherwise None
+        results = self.load()["results"].get(checks_key(checks))
+        if results is None:
+            return None
+        return results["report_results"], results["crash_frames"]
+
+    def add_results(self, checks, report_results, crash_frames):
+        self.load()["results"][checks_key(checks)] = {
+            "report_results": report_results,
+            "crash_frames": [int(frame) for frame in crash_frames]
+        }
+        self.save()
+
+
+# The checks are identified by their names and the arguments given to the check factories
+def checks_key(checks):
+    return json.dumps([[check.name, list(check.arguments)] for check in checks])
+
+# Creates the key for a simulation from the controller, the scenario file and the arguments Esmini is started with
+def cache_key(controller_path, scenario_path, esmini_arguments):
+    key_data = json.dumps({
+        "controller": controller_hash(controller_path),
+        "scenario": file_hash(scenario_path),
+        "arguments": esmini_arguments
+    })
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+def file_hash(file_path):
+    with open(file_path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+# Hashes the controller by its syntax tree, so that changes to comments, docstrings and formatting do not count as a new controller.
+# Files that can't be parsed are hashed by their content.
+def controller_hash(file_path):
+    with open(file_path, "rb") as file:
+        source_code = file.read()
+    try:
+        tree = ast.parse(source_code)
+    except SyntaxError:
+        return hashlib.sha256(source_code).hexdigest()
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and node.body:
+            first = node.body[0]
+            if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+                # Keep a pass statement so that a body with only a docstring stays valid
+                node.body = node.body[1:] or [ast.Pass()]
+    return hashlib.sha256(ast.dump(tree).encode("utf-8")).hexdigest()
@@ -0,0 +1,137 @@
+import ctypes as ct
+import struct
+
+"""A stand-in for the Esmini library with the functions State uses, implemented in Python.
+Ego drives in lane -3 and the other vehicles drive at constant speeds in lanes -2 to -4, without a road, a window or a CSV log.
+It is used to run controllers and State without starting Esmini.
+Screenshots are small top views of the vehicles, written to the working directory under the same names as Esmini uses."""
+
+LANE_WIDTH = 3.5
+STEP_LENGTH = 0.1
+
+# Size of the screenshots in pixels, one pixel per metre along the road and per 0.5 m across it
+IMAGE_WIDTH = 160
+IMAGE_HEIGHT = 48
+
+# The structs are passed either with ct.pointer or with ct.byref, like to the library
+def dereference(argument):
+    return argument.contents if isinstance(argument, ct._Pointer) else argument._obj
+
+
+class SimulatorStub:
+    def __init__(self, number_of_vehicles=5, duration=60.0):
+        self.duration = duration
+        self.time = 0.0
+        self.number_of_images = 0
+        self.vehicles = []
+        for vehicle_id in range(number_of_vehicles):
+            if vehicle_id == 0:
+                lane_id, s, speed = -3, 50.0, 20.0
+            else:
+                lane_id = -2 - vehicle_id % 3
+                s = 20.0 + 25.0 * vehicle_id
+                speed = 15.0 + vehicle_id % 4 * 2.5
+            self.vehicles.append({"id": vehicle_id, "lane_id": lane_id, "s": s, "t": 0.0, "speed": speed,
+                                  "target_speed": speed, "target_t": 0.0, "lane_change_time": 0.0})
+
+    def SE_GetNumberOfObjects(self):
+        return len(self.vehicles)
+
+    def SE_GetId(self, index):
+        return self.vehicles[index]["id"]
+
+    def SE_GetObjectState(self, vehicle_id, state_struct):
+        self.fill_state(self.vehicles[vehicle_id], dereference(state_struct))
+        return 0
+
+    def SE_GetObjectStates(self, number_of_states, state_structs):
+        number_of_states = dereference(number_of_states)
+        number_of_states.value = min(number_of_states.value, len(self.vehicles))
+        for index in range(number_of_states.value):
+            self.fill_state(self.vehicles[index], state_structs[index])
+        return 0
+
+    def fill_state(self, vehicle, state_struct):
+        state_struct.id = vehicle["id"]
+        state_struct.timestamp = self.time
+        state_struct.x = vehicle["s"]
+        state_struct.y = (vehicle["lane_id"] + 0.5) * LANE_WIDTH + vehicle["t"]
+        state_struct.s = vehicle["s"]
+        state_struct.t = (vehicle["lane_id"] + 0.5) * LANE_WIDTH + vehicle["t"]
+        state_struct.laneId = vehicle["lane_id"]
+        state_struct.laneOffset = vehicle["t"]
+        state_struct.speed = vehicle["speed"]
+        state_struct.length = 4.5
+        state_struct.width = 1.8
+        state_struct.height = 1.5
+
+    def SE_GetQuitFlag(self):
+        return 1 if self.time >= self.duration else 0
+
+    def SE_GetSimulationTime(self):
+        return self.time
+
+    def SE_StepDT(self, dt):
+        for vehicle in self.vehicles:
+            # The speed changes with at most 5 m/s^2 and the lane offset with at most 1 m/s towards the targets
+            speed_change = vehicle["target_speed"] - vehicle["speed"]
+            vehicle["speed"] += max(-5.0 * dt, min(5.0 * dt, speed_change))
+            offset_change = vehicle["target_t"] - vehicle["t"]
+            vehicle["t"] += max(-dt, min(dt, offset_change))
+            vehicle["s"] += vehicle["speed"] * dt
+            vehicle["lane_change_time"] = max(0.0, vehicle["lane_change_time"] - dt)
+        self.time += dt
+        return 0
+
+    def SE_InjectSpeedAction(self, action):
+        action = dereference(action)
+        self.vehicles[action.id]["target_speed"] = max(0.0, action.speed)
+
+    def SE_InjectLaneOffsetAction(self, action):
+        action = dereference(action)
+        self.vehicles[action.id]["target_t"] = action.offset
+
+    def SE_InjectLaneChangeAction(self, action):
+        action = dereference(action)
+        vehicle = self.vehicles[action.id]
+        # Lanes -2 to -4 are driveable, the lane id decreases to the right
+        vehicle["lane_id"] = max(-4, min(-2, vehicle["lane_id"] + action.target))
+        vehicle["lane_change_time"] = 3.0
+
+    def SE_InjectedActionOngoing(self, action_type):
+        return self.vehicles[0]["lane_change_time"] > 0
+
+    def SE_GetObjectNumberOfCollisions(self, vehicle_id):
+        return len(self.colliding_vehicles(vehicle_id))
+
+    def SE_GetObjectCollision(self, vehicle_id, index):
+        return self.colliding_vehicles(vehicle_id)[index]
+
+    def SE_GetObjectName(self, vehicle_id):
+        return ("Ego" if vehicle_id == 0 else f"Target{vehicle_id}").encode("utf-8")
+
+    def SE_SaveImagesToFile(self, number_of_frames):
+        for _ in range(number_of_frames):
+            with open(f"screen_shot_{self.number_of_images:05d}.tga", "wb") as file:
+                file.write(self.render_image())
+            self.number_of_images += 1
+        return 0
+
+    # An uncompressed 24 bit TGA image of the road around Ego, with Ego in white and the other vehicles in red
+    def render_image(self):
+        pixels = bytearray(b"\x50" * IMAGE_WIDTH * IMAGE_HEIGHT * 3)
+        ego_s = self.vehicles[0]["s"]
+        for vehicle in self.vehicles:
+            color = b"\xff\xff\xff" if vehicle["id"] == 0 else b"\x00\x00\xff"
+            x_start = int(vehicle["s"] - ego_s + IMAGE_WIDTH / 2 - 2)
+            y_start = int(-((vehicle["lane_id"] + 0.5) * LANE_WIDTH + vehicle["t"]) * 2 - 6)
+            for y in range(max(0, y_start), min(IMAGE_HEIGHT, y_start + 4)):
+                for x in range(max(0, x_start), min(IMAGE_WIDTH, x_start + 5)):
+                    pixels[(y * IMAGE_WIDTH + x) * 3:(y * IMAGE_WIDTH + x + 1) * 3] = color
+        header = struct.pack("<BBBHHBHHHHBB", 0, 0, 2, 0, 0, 0, 0, 0, IMAGE_WIDTH, IMAGE_HEIGHT, 24, 0x20)
+        return header + bytes(pixels)
+
+    def colliding_vehicles(self, vehicle_id):
+        vehicle = self.vehicles[vehicle_id]
+        return [other["id"] for other in self.vehicles
+                if other is not vehicle and other["lane_id"] == vehicle["lane_id"] and abs(other["s"] - vehicle["s"]) < 4.5]
@@ -1,4 +1,8 @@
+import bisect
 import ctypes as ct
+import math
+from collections import Counter
+import numpy as np
 
 
 
@@ -6,58 +10,191 @@ class State:
     def __init__(self, simulator):
         self.simulator = simulator
 
-        # Create structs for the vehicles
+        # The states of all vehicles are kept in one array with the memory layout of SE_ScenarioObjectState, which Esmini writes into directly.
+        # The structs and the vehicles are views of the array, so updating the state allocates no new objects.
         number_of_vehicles = self.simulator.SE_GetNumberOfObjects()
+        self.vehicle_states = np.zeros(number_of_vehicles, dtype=VEHICLE_STATE_DTYPE)
         self.vehicle_structs = {}
+        self.vehicle_state_pointers = []
+        self.vehicles = []
         for vehicle_number in range(number_of_vehicles):
             vehicle_id = simulator.SE_GetId(vehicle_number)
-            vehicle_state_struct = SE_ScenarioObjectState()
+            address = self.vehicle_states.ctypes.data + vehicle_number * VEHICLE_STATE_DTYPE.itemsize
+            vehicle_state_struct = SE_ScenarioObjectState.from_address(address)
             self.vehicle_structs[vehicle_id] = vehicle_state_struct
-        self.vehicles = []
+            self.vehicle_state_pointers.append((vehicle_id, ct.pointer(vehicle_state_struct)))
+            self.vehicles.append(VehicleView(vehicle_state_struct))
+
+        # If the simulator can fill all states in one call, the array is passed to it directly
+        self.get_object_states = getattr(simulator, "SE_GetObjectStates", None)
+        self.vehicle_states_pointer = ct.cast(self.vehicle_states.ctypes.data, ct.POINTER(SE_ScenarioObjectState))
+        self.number_of_states = ct.c_int(number_of_vehicles)
+        self.number_of_states_pointer = ct.pointer(self.number_of_states)
 
         # Create structs for the different actions
         scenarioActionManager = ScenarioActionManager()
         self.lane_offset_action = scenarioActionManager.create_lane_offset_action()
         self.lane_change_action = scenarioActionManager.create_lane_change_action()        
         self.speed_action = scenarioActionManager.create_speed_action()
+        self.lane_offset_action_pointer = ct.pointer(self.lane_offset_action)
+        self.lane_change_action_pointer = ct.pointer(self.lane_change_action)
+        self.speed_action_pointer = ct.pointer(self.speed_action)
+
+        # Vehicles grouped by lane and sorted by s, built on the first neighbour query after each update
+        self.lane_index = None
+
+        # Actions requested by the controller during the current step, injected by flush() at the end of the step.
+        # An action is only injected if it differs from the last injected action of its kind, 
+        # as injecting the same action again restarts its transition in Esmini.
+        self.pending_speed = None
+        self.pending_offset = None
+        self.pending_lane_change = None
+        self.injected_speed = None
+        self.injected_offset = None
+        # Number of injected and suppressed actions of each kind during the simulation
+        self.injected_actions = Counter()
+        self.suppressed_actions = Counter()
 
     def update(self):
-        # Remove previous vehicle objects, update the vehicle information structs and create new vehicles based on the new information.
-        self.vehicles = []
-        for vehicle_id, vehicle_state_struct in self.vehicle_structs.items():
-            return_code = self.simulator.SE_GetObjectState(vehicle_id, ct.byref(vehicle_state_struct))
+        # Esmini refreshes the vehicle states in place, which also updates the vehicle views.
+        self.lane_index = None
+        if self.get_object_states is not None:
+            # The number of states is both the size of the array and the number of states filled in
+            self.number_of_states.value = len(self.vehicle_states)
+            if self.get_object_states(self.number_of_states_pointer, self.vehicle_states_pointer) != 0:
+                print("Something went wrong when vehicle struct was refreshed.")
+            return
+
+        for vehicle_id, vehicle_state_pointer in self.vehicle_state_pointers:
+            return_code = self.simulator.SE_GetObjectState(vehicle_id, vehicle_state_pointer)
             if return_code != 0:
                 print("Something went wrong when vehicle struct was refreshed.")
 
-            vehicle = Vehicle(
-                identity=vehicle_id,
-                position=(vehicle_state_struct.x, vehicle_state_struct.y, vehicle_state_struct.z),
-                speed=vehicle_state_struct.speed,
-                lane_id=vehicle_state_struct.laneId,
-                s=vehicle_state_struct.s,
-                t=vehicle_state_struct.t,
-                heading=vehicle_state_struct.h
-            )
-            self.vehicles.append(vehicle)
+    # Maps each lane id to the s values, the vehicles and the vehicle numbers in the lane, all sorted by s
+    def get_lane_index(self):
+        if self.lane_index is None:
+            self.lane_index = {}
+            order = np.lexsort((self.vehicle_states["s"], self.vehicle_states["laneId"]))
+            for vehicle_number in order.tolist():
+                vehicle = self.vehicles[vehicle_number]
+                lane = self.lane_index.setdefault(vehicle.lane_id, ([], [], []))
+                lane[0].append(vehicle.s)
+                lane[1].append(vehicle)
+                lane[2].append(vehicle_number)
+        return self.lane_index
+
+    # The vehicles in a lane, sorted by s
+    def vehicles_in_lane(self, lane_id):
+        return list(self.get_lane_index().get(lane_id, ([], [], []))[1])
+
+    # The closest vehicle ahead (greater s) of the given vehicle, in its lane or in the given lane. None if there is none.
+    def leader(self, vehicle_number=0, lane_id=None):
+        vehicle = self.vehicles[vehicle_number]
+        s_values, vehicles, _ = self.get_lane_index().get(vehicle.lane_id if lane_id is None else lane_id, ([], [], []))
+        index = bisect.bisect_right(s_values, vehicle.s)
+        return vehicles[index] if index < len(vehicles) else None
 
+    # The closest vehicle behind (smaller s) the given vehicle, in its lane or in the given lane. None if there is none.
+    def follower(self, vehicle_number=0, lane_id=None):
+        vehicle = self.vehicles[vehicle_number]
+        s_values, vehicles, _ = self.get_lane_index().get(vehicle.lane_id if lane_id is None else lane_id, ([], [], []))
+        index = bisect.bisect_left(s_values, vehicle.s)
+        return vehicles[index - 1] if index > 0 else None
+
+    # All vehicles ahead (greater s) of the given vehicle, in its lane or in the given lane, as (vehicle number, vehicle) sorted by s
+    def vehicles_ahead(self, vehicle_number=0, lane_id=None):
+        vehicle = self.vehicles[vehicle_number]
+        s_values, vehicles, numbers = self.get_lane_index().get(vehicle.lane_id if lane_id is None else lane_id, ([], [], []))
+        index = bisect.bisect_right(s_values, vehicle.s)
+        return list(zip(numbers[index:], vehicles[index:]))
+
+    # Distance in s to the leader, the same distance the log checks use. None if there is no leader.
+    def gap_to_leader(self, vehicle_number=0, lane_id=None):
+        leader = self.leader(vehicle_number, lane_id)
+        if leader is None:
+            return None
+        return leader.s - self.vehicles[vehicle_number].s
+
+    # Distance in s to the follower. None if there is no follower.
+    def gap_to_follower(self, vehicle_number=0, lane_id=None):
+        follower = self.follower(vehicle_number, lane_id)
+        if follower is None:
+            return None
+        return self.vehicles[vehicle_number].s - follower.s
+
+    # Seconds until the vehicle reaches its leader at the current speeds. 
+    # None if there is no leader and math.inf if the vehicle is not faster than the leader.
+    def time_to_collision(self, vehicle_number=0, lane_id=None):
+        leader = self.leader(vehicle_number, lane_id)
+        if leader is None:
+            return None
+        relative_speed = self.vehicles[vehicle_number].speed - leader.speed
+        if relative_speed <= 0:
+            return math.inf
+        return (leader.s - self.vehicles[vehicle_number].s) / relative_speed
+
+    def get_collisions(self, vehicle_id=0):
+        # Ids of the vehicles which the vehicle is colliding with in the current step. Requires Esmini to be started with --collision.
+        number_of_collisions = self.simulator.SE_GetObjectNumberOfCollisions(vehicle_id)
+        return [self.simulator.SE_GetObjectCollision(vehicle_id, index) for index in range(number_of_collisions)]
+
+    def get_name(self, vehicle_id):
+        return self.simulator.SE_GetObjectName(vehicle_id).decode("utf-8")
+
+    # The last request of each kind during a step replaces the earlier ones
     def set_offset(self, offset):
-        self.lane_offset_action.offset = offset
-        self.simulator.SE_InjectLaneOffsetAction(ct.byref(self.lane_offset_action))
+        self.request("offset", "pending_offset", float(offset))
 
     def switch_lane(self, lane_id):
-        if not self.simulator.SE_InjectedActionOngoing(5):
-            self.lane_change_action.target = lane_id
-            self.simulator.SE_InjectLaneChangeAction(ct.byref(self.lane_change_action))
+        # A lane change is relative to the current lane, so only the first request during a step is kept
+        if self.pending_lane_change is not None:
+            self.suppressed_actions["lane_change"] += 1
+            return
+        self.pending_lane_change = lane_id
 
     def set_speed(self, speed):
-        self.speed_action.speed = float(speed)
-        self.speed_action.transition_value = 10.0
-        self.simulator.SE_InjectSpeedAction(ct.byref(self.speed_action))
+        self.request("speed", "pending_speed", (float(speed), 10.0))
 
     def brake(self):
-        self.speed_action.speed = 0
-        self.speed_action.transition_value = 50.0
-        self.simulator.SE_InjectSpeedAction(ct.byref(self.speed_action))
+        self.request("speed", "pending_speed", (0.0, 50.0))
+
+    def request(self, kind, attribute, value):
+        if getattr(self, attribute) is not None:
+            self.suppressed_actions[kind] += 1
+        setattr(self, attribute, value)
+
+    # Injects the actions requested during the step which change what the vehicle does. Called after each controller step.
+    def flush(self):
+        if self.pending_lane_change is not None:
+            if not self.simulator.SE_InjectedActionOngoing(5):
+                self.lane_change_action.target = self.pending_lane_change
+                self.simulator.SE_InjectLaneChangeAction(self.lane_change_action_pointer)
+                self.injected_actions["lane_change"] += 1
+                # The lane offset is not assumed to survive a lane change, so the next offset request is injected
+                self.injected_offset = None
+            else:
+                self.suppressed_actions["lane_change"] += 1
+            self.pending_lane_change = None
+
+        if self.pending_offset is not None:
+            if self.pending_offset != self.injected_offset:
+                self.lane_offset_action.offset = self.pending_offset
+                self.simulator.SE_InjectLaneOffsetAction(self.lane_offset_action_pointer)
+                self.injected_offset = self.pending_offset
+                self.injected_actions["offset"] += 1
+            else:
+                self.suppressed_actions["offset"] += 1
+            self.pending_offset = None
+
+        if self.pending_speed is not None:
+            if self.pending_speed != self.injected_speed:
+                self.speed_action.speed, self.speed_action.transition_value = self.pending_speed
+                self.simulator.SE_InjectSpeedAction(self.speed_action_pointer)
+                self.injected_speed = self.pending_speed
+                self.injected_actions["speed"] += 1
+            else:
+                self.suppressed_actions["speed"] += 1
+            self.pending_speed = None
 
 class Vehicle:
     def __init__(self, identity, position, speed, lane_id, s, t, heading):
@@ -74,6 +211,50 @@ class Vehicle:
                 f"Speed: {self.speed}, Lane ID: {self.lane_id}, "
                 f"S: {self.s}, T: {self.t}")
 
+class VehicleView:
+    """A vehicle with the same attributes as Vehicle, read from the state struct of the vehicle.
+    The values change when the state is updated, snapshot() returns a Vehicle with the current values."""
+    __slots__ = ("_struct",)
+
+    def __init__(self, vehicle_state_struct):
+        self._struct = vehicle_state_struct
+
+    @property
+    def id(self):
+        return self._struct.id
+
+    @property
+    def position(self):
+        return (self._struct.x, self._struct.y, self._struct.z)
+
+    @property
+    def speed(self):
+        return self._struct.speed
+
+    @property
+    def lane_id(self):
+        return self._struct.laneId
+
+    @property
+    def s(self):
+        return self._struct.s
+
+    @property
+    def t(self):
+        return self._struct.t
+
+    @property
+    def heading(self):
+        return self._struct.h
+
+    def snapshot(self):
+        return Vehicle(self.id, self.position, self.speed, self.lane_id, self.s, self.t, self.heading)
+
+    def __repr__(self):
+        return (f"Vehicle ID: {self.id}, Position: {self.position}, "
+                f"Speed: {self.speed}, Lane ID: {self.lane_id}, "
+                f"S: {self.s}, T: {self.t}")
+
 
 """Structs for communicating with Esmini via ctypes"""
 
@@ -136,6 +317,9 @@ class SE_ScenarioObjectState(ct.Structure):
         ("visibilityMask", ct.c_int),
     ]
 
+# NumPy record type with the same fields and memory layout as SE_ScenarioObjectState
+VEHICLE_STATE_DTYPE = np.dtype(SE_ScenarioObjectState)
+
 """Initializations of structs"""
 
 class ScenarioActionManager:
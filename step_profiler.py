@@ -0,0 +1,78 @@
+import json
+import os
+import time
+import numpy as np
+
+"""Timing of the phases of each simulation step: refreshing the state, the controller step, saving screenshots and stepping Esmini.
+The times are stored in a preallocated array during the simulation and summarized afterwards, so the overhead per step is a few clock reads.
+The summary also holds the number of controller actions injected into Esmini and suppressed by the state layer, by kind of action."""
+
+PHASES = ("update", "controller", "capture", "simulator_step")
+
+# The profile of a simulation, relative to its working directory
+PROFILE_PATH = os.path.join("recordings", "step_profile.json")
+
+# Initial capacity in steps, enough for a 30 s scenario with 0.1 s steps
+INITIAL_STEPS = 320
+
+
+class StepProfiler:
+    def __init__(self, step_length=0.1):
+        self.step_length = step_length
+        self.times = np.zeros((INITIAL_STEPS, len(PHASES)))
+        self.number_of_steps = 0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.injected_actions = {}
+        self.suppressed_actions = {}
+
+    # Durations of the phases of one step in seconds, in the order of PHASES
+    def add(self, update, controller, capture, simulator_step):
+        if self.number_of_steps == len(self.times):
+            self.times = np.concatenate([self.times, np.zeros_like(self.times)])
+        self.times[self.number_of_steps] = (update, controller, capture, simulator_step)
+        self.number_of_steps += 1
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    # The counters of the state at the end of the simulation
+    def count_actions(self, injected_actions, suppressed_actions):
+        self.injected_actions = dict(injected_actions)
+        self.suppressed_actions = dict(suppressed_actions)
+
+    # Latency percentiles of each phase in ms and the real-time factor, the simulated time divided by the wall-clock time of the loop.
+    # A real-time factor above 1 means the simulation ran faster than real time.
+    def summary(self):
+        times = self.times[:self.number_of_steps] * 1000
+        wall_time = (self.end_time or time.perf_counter()) - self.start_time
+        simulated_time = self.number_of_steps * self.step_length
+        summary = {
+            "steps": self.number_of_steps,
+            "wall_time_s": round(wall_time, 3),
+            "real_time_factor": round(simulated_time / wall_time, 2) if wall_time > 0 else None,
+            # Controller steps that took longer than the simulated step, i.e. would have missed a real control-loop deadline
+            "controller_deadline_misses": int(np.sum(times[:, PHASES.index("controller")] > self.step_length * 1000)),
+            # Actions that were unchanged or replaced within the same step are suppressed instead of injected
+            "actions": {"injected": self.injected_actions, "suppressed": self.suppressed_actions},
+        }
+        for index, phase in enumerate(PHASES):
+            phase_times = times[:, index]
+            summary[phase] = {
+                "p50_ms": round(float(np.percentile(phase_times, 50)), 3) if len(phase_times) else None,
+                "p99_ms": round(float(np.percentile(phase_times, 99)), 3) if len(phase_times) else None,
+                "max_ms": round(float(phase_times.max()), 3) if len(phase_times) else None,
+            }
+        return summary
+
+    def save(self, profile_path=PROFILE_PATH):
+        os.makedirs(os.path.dirname(profile_path) or ".", exist_ok=True)
+        with open(profile_path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+
+def load_profile(profile_path):
+    if not os.path.exists(profile_path):
+        return None
+    with open(profile_path) as file:
+        return json.load(file)
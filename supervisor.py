@@ -0,0 +1,138 @@
+import multiprocessing
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+"""Runs simulations in worker processes under a watchdog with wall-clock budgets for each controller step and each scenario.
+A worker which exceeds a budget is killed and replaced by a new one, and its simulation gets the result "timeout".
+Workers publish the start time of the controller step they are in through a shared value, which the supervisor polls."""
+
+# Seconds between the checks of the budgets
+POLL_INTERVAL = 0.05
+
+# Start time of the controller step the current process is in, 0 outside of steps. Only set in worker processes.
+heartbeat = None
+
+
+# Called by the simulation loop around each controller step
+def step_started():
+    if heartbeat is not None:
+        heartbeat.value = time.monotonic()
+
+def step_finished():
+    if heartbeat is not None:
+        heartbeat.value = 0.0
+
+
+# Entry point of a worker process. Runs the tasks sent through the connection until it receives None.
+def worker_main(connection, step_heartbeat):
+    global heartbeat
+    heartbeat = step_heartbeat
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        function, args = task
+        try:
+            result = function(*args)
+        except Exception as e:
+            result = ("error", e, None)
+        heartbeat.value = 0.0
+        try:
+            connection.send(result)
+        except Exception:
+            # The result can't be pickled, e.g. an exception refers to the state of the controller. Nothing was sent yet,
+            # so the exceptions in it are sent again as RuntimeErrors with the same message.
+            connection.send(tuple(RuntimeError(f"{type(value).__name__}: {value}") if isinstance(value, BaseException) else value for value in result))
+
+
+class Worker:
+    def __init__(self):
+        self.heartbeat = multiprocessing.RawValue("d", 0.0)
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=worker_main, args=(worker_connection, self.heartbeat), daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self.task_index = None
+        self.start_time = None
+
+    def submit(self, task_index, function, args):
+        self.task_index = task_index
+        self.start_time = time.monotonic()
+        self.heartbeat.value = 0.0
+        self.connection.send((function, args))
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.connection.close()
+
+
+class Supervisor:
+    def __init__(self, number_of_workers, step_budget=None, scenario_budget=None):
+        self.number_of_workers = number_of_workers
+        # Wall-clock budgets in seconds, None for no limit
+        self.step_budget = step_budget
+        self.scenario_budget = scenario_budget
+
+    # Runs function(*args) for each args in a worker and returns the results in the same order.
+    # The functions return tuples starting with the run result, timeouts and crashed workers give ("timeout"|"error", exception, None).
+    def run(self, function, args_list):
+        results = [None] * len(args_list)
+        pending = deque(enumerate(args_list))
+        workers = [Worker() for _ in range(min(self.number_of_workers, len(args_list)))]
+        busy = []
+
+        def assign(worker):
+            if pending:
+                task_index, args = pending.popleft()
+                worker.submit(task_index, function, args)
+                busy.append(worker)
+            else:
+                worker.stop()
+
+        def replace(worker, result):
+            results[worker.task_index] = result
+            busy.remove(worker)
+            worker.kill()
+            if pending:
+                assign(Worker())
+
+        for worker in workers:
+            assign(worker)
+
+        while busy:
+            ready = wait([worker.connection for worker in busy], timeout=POLL_INTERVAL)
+            for worker in [worker for worker in busy if worker.connection in ready]:
+                try:
+                    results[worker.task_index] = worker.connection.recv()
+                except (EOFError, OSError):
+                    # The worker process itself failed, e.g. if Esmini crashed
+                    worker.process.join(timeout=1)
+                    replace(worker, ("error", RuntimeError(f"The simulation process exited with code {worker.process.exitcode}"), None))
+                    continue
+                except Exception as e:
+                    # The result was received but can't be unpickled here, e.g. if it refers to a class only the worker has loaded.
+                    # The worker itself is still usable.
+                    results[worker.task_index] = ("error", RuntimeError(f"The result of the simulation could not be read: {e!r}"), None)
+                busy.remove(worker)
+                assign(worker)
+
+            now = time.monotonic()
+            for worker in list(busy):
+                step_start = worker.heartbeat.value
+                if self.step_budget is not None and step_start > 0 and now - step_start > self.step_budget:
+                    replace(worker, ("timeout", TimeoutError(f"A single call of step() ran for more than {self.step_budget} s."), None))
+                elif self.scenario_budget is not None and now - worker.start_time > self.scenario_budget:
+                    replace(worker, ("timeout", TimeoutError(f"The simulation ran for more than {self.scenario_budget} s."), None))
+        return results
@@ -1,19 +1,56 @@
-import ctypes as ct
 import sys
 import os
 from datetime import datetime
 import json
 import shutil
+import contextlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 import controller_creator
 import report_gen_static
 import report_gen_vision
 import report_gen_log
+import report_gen_online
 import state_layer
+import result_cache
+import esmini_binding
+import trajectory_log
+import preflight
+import supervisor
+import step_profiler
+import controller_output
+import frame_buffer
+import llm_backend
+import controller_loader
+import time
 from evaluation_suites import * 
-import importlib
 
-def main(evaluation_suite):
+# Locations of the Esmini binaries and scenarios, relative to the directory Svala is started from
+ESMINI_BIN_FOLDER = "../bin"
+SCENARIO_FOLDER = "../resources/xosc/"
+
+# The CSV log written by Esmini if requested, relative to its working directory. The checks use the trajectory log recorded by Svala.
+CSV_LOG_PATH = "recordings\\full_log.csv"
+
+# Limits on the number of controller generations and of scenario sets simulated at the same time, shared by the suites of a batch.
+# Set by batch_runner, None when a single suite is run.
+llm_slots = None
+simulation_slots = None
+
+# Holds one of the slots while the block runs, if there is a limit
+@contextlib.contextmanager
+def slot(slots):
+    if slots is None:
+        yield
+    else:
+        with slots:
+            yield
+
+# Returns the run folder. With isolated set, the controller is kept in the run folder instead of the current directory, 
+# so that several suites can run at the same time in one process.
+# The session is stored with the threads of the run, so that recordings of runs made at the same time can be told apart.
+def main(evaluation_suite, isolated=False, session=None):
 
     """
     The main function of Svala. 
@@ -58,34 +95,68 @@ def main(evaluation_suite):
     # Template used for giving feedback during iterative improvement
     correction_template = evaluation_suite['correction_template']
 
+    # Number of scenarios simulated at the same time, each in its own process (1 runs them in series)
+    parallel_workers = evaluation_suite.get('parallel_workers', 1)
+
+    # Toggle for simulating without a window and screenshots. Frames for the vision function are then rendered in a replay.
+    headless = evaluation_suite.get('headless', False)
+
+    # Toggle for reusing stored results of simulations with an equivalent controller, scenario and Esmini arguments
+    cache = result_cache.ResultCache(max_size_mb=evaluation_suite.get('result_cache_size_mb', 500)) if evaluation_suite.get('use_result_cache', False) else None
+
+    # Toggle for evaluating the checks during the simulation, which ends the simulation early once all checks have failed
+    online_checks = evaluation_suite.get('online_checks', False)
+
+    # Toggle for letting Esmini write a CSV log in addition to the binary trajectory log
+    csv_log = evaluation_suite.get('csv_log', False)
+
+    # Wall-clock budgets in seconds for a single controller step and for a whole simulation. Simulations exceeding them are stopped with the result timeout.
+    time_budgets = (evaluation_suite.get('step_time_budget', None), evaluation_suite.get('scenario_time_budget', None))
+
+    # Seconds a controller generation may take in total, including retries of failed runs
+    generation_deadline = evaluation_suite.get('generation_deadline', controller_creator.GENERATION_DEADLINE)
+
+    # Size in pixels and JPEG quality of the screenshots sent to the vision model
+    vision_images = (tuple(evaluation_suite.get('vision_image_size', report_gen_vision.IMAGE_SIZE)), evaluation_suite.get('vision_jpeg_quality', report_gen_vision.JPEG_QUALITY))
+
+    # Number of controllers requested at the same time in each iteration. Each is tested with the scenario set and the best one is kept.
+    number_of_candidates = evaluation_suite.get('candidates', 1)
+
+    # Where the requests to the language models go: the live API, or recorded, replayed or made-up responses from a local server
+    llm_backend.configure(evaluation_suite.get('llm_backend', None))
+
     # Create a new directory for saving information about the run
     run_path = create_run_folder(task)
 
-    # Create a new controller
-    if create_new_controller:
-        print("WARNING: API CALLS. Controller Creation")
-        thread, text, correctNumberOfFiles = controller_creator.create_controller(requirement_specification, run_path, 0)
-        # Abort the execution if the controller creator failed to produce a new controller file.
-        if not correctNumberOfFiles:
-            raise Exception(f"No controller was created for iteration {0}") 
+    # The controller used when no candidates are created. An isolated run starts from a copy of the controller in the current directory.
+    controller_path = "custom_controller.py"
+    if isolated:
+        controller_path = os.path.join(run_path, "custom_controller.py")
+        if os.path.exists("custom_controller.py"):
+            shutil.copy("custom_controller.py", controller_path)
 
-    # Perform static code analysis to begin the log_string
-    static_analysis = report_gen_static.static_analysis_string("custom_controller.py", 0, task, create_new_controller, use_vision_api)
-    log_string = static_analysis
+    # Arguments of run_scenario_set which are the same in every iteration
+    scenario_set = dict(scenarios=scenarios, checks_list_list=checks_list_list, use_vision_api=use_vision_api, task=task, run_path=run_path, 
+        parallel_workers=parallel_workers, headless=headless, cache=cache, online_checks=online_checks, csv_log=csv_log, time_budgets=time_budgets, vision_images=vision_images)
 
-    # Run the scenario with the new controller. 
+    # Create a new controller and run the scenario with it. 
     # Reports are natural language reports from scenarios where the controller failed. 
-    (log_success_fail, reports, report_json_list) = run_scenario_set(scenarios, checks_list_list, use_vision_api, task, 0, run_path)
+    (thread, controller_path, (log_success_fail, reports, report_json_list), candidates) = create_and_test_controller(requirement_specification, None, 0, run_path, 
+        create_new_controller, number_of_candidates, generation_deadline, scenario_set, controller_path, session)
+
+    # Perform static code analysis to begin the log_string
+    static_analysis = report_gen_static.static_analysis_string(controller_path, 0, task, create_new_controller, use_vision_api)
+    log_string = static_analysis
 
     # Formats the reports into a string with new lines and append to current log string
     log_string += format_reports(0, reports)
 
     # Creates a JSON object for storing information about the run. 
-    evaluation_data = create_evaluation_json(evaluation_suite, log_success_fail, report_json_list)
+    evaluation_data = create_evaluation_json(evaluation_suite, log_success_fail, report_json_list, candidates, controller_path)
 
     # Iterative Improvement of the controller if failed a test case and the number of iterations are not exceeded 
     iteration = 0
-    while ((log_success_fail['fail'] > 0 or log_success_fail['error'] > 0) and iteration < max_iterations):
+    while ((log_success_fail['fail'] > 0 or log_success_fail['error'] > 0 or log_success_fail['timeout'] > 0) and iteration < max_iterations):
         correction = correction_template.format(log_success_fail['fail'], 
            log_success_fail['fail'] + log_success_fail['success'], 
            static_analysis, 
@@ -94,21 +165,16 @@ def main(evaluation_suite):
 
         iteration += 1
 
-        # Generate a new controller based on the feedback
-        if create_new_controller:
-            print("WARNING: API CALLS. Controller Creation")
-            thread, text, correctNumberOfFiles = controller_creator.create_controller(correction, run_path, iteration, thread=thread)
-            # Abort the execution if the controller creator failed to produce a new controller file.
-            if not correctNumberOfFiles:
-                raise Exception(f"No controller was created for iteration {iteration}") 
+        # Generate a new controller based on the feedback and test it
+        (thread, controller_path, (log_success_fail, reports, report_json_list), candidates) = create_and_test_controller(correction, thread, iteration, run_path, 
+            create_new_controller, number_of_candidates, generation_deadline, scenario_set, controller_path, session)
 
-        static_analysis = report_gen_static.static_analysis_string("custom_controller.py", iteration, task, create_new_controller, use_vision_api)
+        static_analysis = report_gen_static.static_analysis_string(controller_path, iteration, task, create_new_controller, use_vision_api)
         log_string += static_analysis
 
-        (log_success_fail, reports, report_json_list) = run_scenario_set(scenarios, checks_list_list, use_vision_api, task, iteration, run_path)
         log_string += format_reports(iteration, reports)
 
-        evaluation_data["iterations"].append(create_iteration_json(iteration, log_success_fail, report_json_list))
+        evaluation_data["iterations"].append(create_iteration_json(iteration, log_success_fail, report_json_list, candidates, controller_path))
     
     final_statement = f"{iteration} iterations of corrections were performed. The final controller was {'unsuccessful' if reports else 'successful'}.\n"
     log_string += final_statement
@@ -116,33 +182,217 @@ def main(evaluation_suite):
     # Saves both the log and the JSON object to the newly created test directory
     report_gen_log.create_log(f"{task}", log_string, log_directory=run_path)
     save_evaluation_data(evaluation_data, run_path)
+    return run_path
 
-# Tests each provided scenario with the current controller and returns reports
-def run_scenario_set(scenarios, checks_list_list, use_vision_api, task, iteration, run_path):
+# Creates the controller of an iteration, unless create_new_controller is off, and tests it with the scenario set.
+# Returns the thread to continue, the path of the controller, the results of run_scenario_set and the summaries of the candidates, None without candidates.
+def create_and_test_controller(prompt, thread, iteration, run_path, create_new_controller, number_of_candidates, generation_deadline, scenario_set, controller_path="custom_controller.py", session=None):
+    if create_new_controller and number_of_candidates > 1:
+        return create_candidates(prompt, thread, iteration, run_path, number_of_candidates, generation_deadline, scenario_set, session)
 
-    reports = []
-    report_json_list = []
-    log_success_fail = {'success':0, 'fail':0, 'error':0}
-    for scenario, checks in zip(scenarios, checks_list_list):
+    if create_new_controller:
+        print("WARNING: API CALLS. Controller Creation")
+        with slot(llm_slots):
+            thread, text, correctNumberOfFiles = controller_creator.create_controller(prompt, run_path, iteration, thread=thread, deadline=generation_deadline, controller_path=controller_path, session=session)
+        # Abort the execution if the controller creator failed to produce a new controller file.
+        if not correctNumberOfFiles:
+            raise Exception(f"No controller was created for iteration {iteration}") 
+    return (thread, controller_path, run_scenario_set(iteration=iteration, controller_path=controller_path, **scenario_set), None)
+
+# Requests several controllers at the same time, each on its own copy of the thread, and tests each with the scenario set as soon as it is created.
+# The candidate which passes the most checks, and then has the best static metrics, is kept and its thread is continued.
+# The candidates are saved in the run folder under candidates/, their logs under "<iteration>_candidate<number>".
+# The custom_controller.py in the current directory is left as it is.
+def create_candidates(prompt, thread, iteration, run_path, number_of_candidates, generation_deadline, scenario_set, session=None):
+    print(f"WARNING: API CALLS. Controller Creation, {number_of_candidates} candidates")
+    # The copies are made before any candidate adds the new message to its thread
+    with slot(llm_slots):
+        threads = [thread] + [controller_creator.fork_thread(thread, run_path, iteration, session, candidate) if thread is not None else None for candidate in range(1, number_of_candidates)]
+
+    def create_and_test(candidate, candidate_thread):
+        label = f"{iteration}_candidate{candidate}"
+        controller_path = os.path.join(os.path.abspath(run_path), "candidates", label, "custom_controller.py")
+        try:
+            with slot(llm_slots):
+                candidate_thread, text, correctNumberOfFiles = controller_creator.create_controller(prompt, run_path, iteration, thread=candidate_thread, 
+                    deadline=generation_deadline, controller_path=controller_path, candidate=candidate, session=session)
+        except Exception as e:
+            print(f"Candidate {candidate} of iteration {iteration} could not be created: {e!r}")
+            return None
+        if not correctNumberOfFiles:
+            return None
+        results = run_scenario_set(iteration=label, controller_path=controller_path, **scenario_set)
+        return (candidate_thread, controller_path, results, report_gen_static.static_analysis_json(controller_path))
+
+    # Each candidate is simulated in its own pool of worker processes, so the simulations of one start while others are still generated
+    with ThreadPoolExecutor(max_workers=number_of_candidates) as executor:
+        candidates = list(executor.map(create_and_test, range(number_of_candidates), threads))
+
+    created = [candidate for candidate in range(number_of_candidates) if candidates[candidate] is not None]
+    # Abort the execution if the controller creator failed to produce any controller file.
+    if not created:
+        raise Exception(f"No controller was created for iteration {iteration}") 
+    best = max(created, key=lambda candidate: candidate_rank(*candidates[candidate][2:]))
+    (thread, controller_path, results, _) = candidates[best]
+    print(f"Candidate {best} of iteration {iteration} was selected")
+
+    # The selected controller is also saved where a controller created without candidates is
+    os.makedirs(os.path.join(run_path, "controller"), exist_ok=True)
+    shutil.copy(controller_path, os.path.join(run_path, "controller", f"{iteration}_custom_controller.py"))
+
+    summaries = []
+    for candidate in range(number_of_candidates):
+        summary = {"candidate": candidate, "selected": candidate == best, "created": candidates[candidate] is not None}
+        if candidates[candidate] is not None:
+            (_, _, (log_success_fail, _, _), static) = candidates[candidate]
+            summary.update({"run_success": log_success_fail['success'], "run_fail": log_success_fail['fail'], 
+                "run_error": log_success_fail['error'], "run_timeout": log_success_fail['timeout'], "static": static})
+        summaries.append(summary)
+    return (thread, controller_path, results, summaries)
+
+# Order of the candidates: more passed checks first, then fewer PEP 8 errors, a higher maintainability and a lower complexity
+def candidate_rank(results, static):
+    (log_success_fail, _, _) = results
+    # Controllers which could not be parsed have no code metrics and are ranked below the others with the same results
+    parsed = static["code_maintainability_score"] is not None
+    return (log_success_fail['success'], -(static["pep8_errors"] or 0), parsed, static["code_maintainability_score"] or 0, -(static["code_complexity"] or 0))
+
+# Tests each provided scenario with the current controller and returns reports. Takes the arguments of simulate_scenario_set.
+# In a batch the simulations wait for a free simulation slot. The answers of the vision model, which come once the copies of its images
+# are written to the run folder, are waited for after the slot is released.
+def run_scenario_set(*args, **kwargs):
+    with slot(simulation_slots):
+        (log_success_fail, reports, report_json_list, vision_requests) = simulate_scenario_set(*args, **kwargs)
+
+    # The answers of the vision model are collected once all scenarios have been simulated
+    for report_index, json_index, vision_request in vision_requests:
+        visual_report = vision_request.result()
+        reports[report_index] = f"Vision based report for scenario {report_json_list[json_index]['scenario']}: \n{visual_report}"
+        report_json_list[json_index]["vision"] = visual_report
+    return (log_success_fail, reports, report_json_list)
 
-        scenario_file = "../resources/xosc/" + scenario
+# Simulates each provided scenario with the controller and returns the reports, with the requests to the vision model still running.
+# The controller is read once and handed to the simulations as source code. 
+# A controller_path outside of the current directory, e.g. a candidate, is always simulated in worker processes, each in a private directory.
+def simulate_scenario_set(scenarios, checks_list_list, use_vision_api, task, iteration, run_path, parallel_workers=1, headless=False, cache=None, online_checks=False, csv_log=False, time_budgets=(None, None), vision_images=(report_gen_vision.IMAGE_SIZE, report_gen_vision.JPEG_QUALITY), controller_path="custom_controller.py"):
 
-        captureInterval = 10
+    captureInterval = 10
+    controller_source = controller_loader.read_controller(controller_path)
+    isolated = os.path.dirname(os.path.abspath(controller_path)) != os.getcwd()
 
-        (run_result, message) = run_simulation(scenario_file, captureInterval)
+    # A controller which can't run at all is reported once, without starting Esmini for any scenario.
+    # With time budgets, or for a controller in another folder, the check runs in a supervised process as well, since it runs the controller.
+    if time_budgets != (None, None) or isolated:
+        (preflight_result, preflight_error, _) = supervisor.Supervisor(1, *time_budgets).run(preflight.run_check, [(controller_path, controller_source)])[0]
+    else:
+        preflight_error = preflight.check_controller(controller_path, source=controller_source)
+        preflight_result = "error" if preflight_error is not None else "success"
+    if preflight_result != "success":
+        print(f"The controller failed the pre-flight check: {preflight_error!r}")
+        if preflight_result == "timeout":
+            reports = [f"The controller exceeded its time budget before any scenario was simulated. The same applies to all {len(scenarios)} scenarios. {preflight_error}"]
+        else:
+            reports = [f"Attempt to use the controller file resulted in a crash before any scenario was simulated. The same error applies to all {len(scenarios)} scenarios. Error message {preflight_error}"]
+        log_success_fail = {'success':0, 'fail':0, 'error':0, 'timeout':0}
+        log_success_fail[preflight_result] = len(scenarios)
+        report_json_list = [{"scenario":scenario, "results":preflight_result, "vision":"N/A"} for scenario in scenarios]
+        return (log_success_fail, reports, report_json_list, [])
+
+    # Look up the scenarios which have already been simulated with an equivalent controller
+    cache_keys = [None] * len(scenarios)
+    cache_entries = [None] * len(scenarios)
+    if cache is not None:
+        cache_keys = [result_cache.cache_key(controller_path, SCENARIO_FOLDER + scenario, esmini_arguments("", headless, csv_log)) for scenario in scenarios]
+        cache_entries = [cache.get(key) for key in cache_keys]
+    uncached_scenarios = [scenario for scenario, cache_entry in zip(scenarios, cache_entries) if cache_entry is None]
+
+    # The checks to evaluate during each simulation, None if they are evaluated on the trajectory log afterwards
+    online_specs = []
+    for checks, cache_entry in zip(checks_list_list, cache_entries):
+        if cache_entry is None:
+            use_online = online_checks and report_gen_online.supports_online(checks)
+            online_specs.append(report_gen_online.check_specs(checks) if use_online else None)
+
+    # Each simulation result is a tuple of (run_result, message, work_dir, online_report), where work_dir holds the logs and the screenshots.
+    # Simulations with time budgets run in supervised worker processes, also when they are not run in parallel.
+    if parallel_workers > 1 or time_budgets != (None, None) or isolated:
+        simulations = iter(run_simulations_parallel(uncached_scenarios, captureInterval, parallel_workers, headless, online_specs, csv_log, time_budgets, controller_source))
+    else:
+        # A generator, so that each scenario is simulated in the current directory only after the previous one has been evaluated and cleaned up
+        simulations = (run_simulation_in_current_folder(scenario, captureInterval, headless, specs, csv_log, controller_source) for scenario, specs in zip(uncached_scenarios, online_specs))
 
-        copy_csv_log(run_path, iteration, scenario)
+    reports = []
+    report_json_list = []
+    log_success_fail = {'success':0, 'fail':0, 'error':0, 'timeout':0}
+    # Requests to the vision model still waiting for an answer, as (index in reports, entry in report_json_list, future)
+    vision_requests = []
+    # The results are evaluated in the order of the scenarios, regardless of the order in which the simulations finished
+    for scenario, checks, cache_key, cache_entry in zip(scenarios, checks_list_list, cache_keys, cache_entries):
+
+        from_cache = cache_entry is not None
+        if not from_cache:
+            (run_result, message, work_dir, online_report) = next(simulations)
+            log_paths = simulation_logs(work_dir)
+        else:
+            # Esmini is not started for cached scenarios. Screenshots, if needed, are rendered by a replay in the current directory,
+            # or in a private directory for a controller in another folder.
+            work_dir = os.getcwd() if not isolated else tempfile.mkdtemp(prefix="svala_")
+            (run_result, message, online_report) = (cache_entry.run_result, cache_entry.message, None)
+            log_paths = cache_entry.log_paths()
+        trajectory_path = next((path for path in log_paths if path.endswith(".npy")), None)
+
+        copy_logs(run_path, iteration, scenario, log_paths)
+
+        # Timing of the simulation steps, not available for cached scenarios
+        profile = None
+        if not from_cache:
+            profile_path = os.path.join(work_dir, step_profiler.PROFILE_PATH)
+            profile = step_profiler.load_profile(profile_path)
+            if profile is not None:
+                copy_logs(run_path, iteration, scenario, [profile_path])
+                # Removed so that a later scenario simulated in the same folder can't be given this profile
+                os.remove(profile_path)
+
+        # An excerpt of what the controller printed is added to the report, the captured output is saved in the run folder
+        output_excerpt = ""
+        if not from_cache:
+            output_path = os.path.join(work_dir, controller_output.OUTPUT_PATH)
+            output_excerpt = controller_output.load_excerpt(output_path)
+            if os.path.exists(output_path):
+                copy_logs(run_path, iteration, scenario, [output_path])
+                os.remove(output_path)
+        output_report = f"\nController output:\n{output_excerpt}" if output_excerpt else ""
 
         if run_result == "error":
-            reports.append(f"Attempt to use the controller file resulted in a crash. Error message {message}")
+            # Simulations which ended in an error are not cached, since the error might be caused by Esmini rather than the controller
+            reports.append(f"Attempt to use the controller file resulted in a crash. Error message {message}{output_report}")
             log_success_fail['error'] += 1
-            report_json_list.append({"scenario":scenario, "results":"error", "vision":"N/A"}) 
+            report_json_list.append({"scenario":scenario, "results":"error", "vision":"N/A", "profile":profile}) 
+
+        elif run_result == "timeout":
+            # The controller was too slow or stuck, e.g. in an infinite loop, and its worker process was stopped
+            reports.append(f"The simulation of scenario {scenario} was stopped because the controller exceeded its time budget. {message}")
+            log_success_fail['timeout'] += 1
+            report_json_list.append({"scenario":scenario, "results":"timeout", "vision":"N/A"})
 
         else: 
-            # Generate natural language report based on the logs 
-            log_report_list, crash_frames = report_gen_log.generate_report(checks, "recordings\\full_log.csv")
+            # Generate natural language report based on the logs, unless the same checks were already run on a cached log
+            cached_results = cache_entry.get_results(checks) if cache_entry is not None else None
+            if cached_results is not None:
+                log_report_list, crash_frames = cached_results
+            else:
+                if online_report is not None:
+                    log_report_list, crash_frames = online_report.results()
+                else:
+                    log_report_list, crash_frames = report_gen_log.generate_report(checks, trajectory_path)
+                # Simulations ended early by the online checks are not cached, since other checks need the whole trajectory
+                stopped_early = online_report is not None and online_report.stopped_early
+                if cache is not None and not stopped_early:
+                    if cache_entry is None:
+                        cache_entry = cache.put(cache_key, log_paths, run_result, message)
+                    cache_entry.add_results(checks, log_report_list, crash_frames)
             log_report = report_gen_log.format_report(log_report_list)
-            reports.append(f"Log based report for scenario: {scenario}: \n{log_report}")
+            reports.append(f"Log based report for scenario: {scenario}: \n{log_report}{output_report}")
 
             success = all(report_dict['success'] for report_dict in log_report_list)
             log_success_fail['success'] += sum(report_dict['success'] for report_dict in log_report_list)
@@ -151,104 +401,222 @@ def run_scenario_set(scenarios, checks_list_list, use_vision_api, task, iteratio
             visual_report = "Vision function was not used"
             # Generate natural language report based on the screenshots
             if use_vision_api and not success and crash_frames:
-                crash_frame = crash_frames[len(crash_frames)//2]//captureInterval
+                # The captured step closest to the middle of the collision, and the captures before and after it
+                crash_step = crash_frames[len(crash_frames)//2]//captureInterval*captureInterval
+                frame_index = frame_buffer.load_index(work_dir) if not from_cache else {}
+                frame_paths = frame_buffer.select_frames(frame_index, crash_step, captureInterval)
+                if not frame_paths:
+                    # No screenshots were kept around the crash, e.g. in headless mode, so they are rendered by simulating the scenario again
+                    replay_crash_frames(scenario, captureInterval, crash_step, work_dir, controller_source)
+                    frame_paths = frame_buffer.select_frames(frame_buffer.load_index(work_dir), crash_step, captureInterval)
                 print("WARNING: API CALLS. Vision")
-                visual_report = report_gen_vision.generate_visual_report(crash_frame, task, iteration, scenario, run_path)
-                reports.append(f"Vision based report for scenario {scenario}: \n{visual_report}")
+                # The model is asked in the background while the next scenarios are simulated. 
+                # The place of the report is reserved, so the order of the reports is the same as if the answer had been waited for.
+                vision_request = report_gen_vision.submit_visual_report(frame_paths, task, iteration, scenario, run_path, *vision_images)
+                reports.append(None)
+                vision_requests.append((len(reports) - 1, len(report_json_list), vision_request))
 
             report_json_list.append(
                 {
                     "scenario":scenario, 
                     "results":log_report_list,
-                    "vision":visual_report
+                    "vision":visual_report,
+                    "profile":profile
                 }
             )
 
-        # Remove the TGA screenshots from the working directory. 
-        report_gen_vision.remove_TGA()
-    return (log_success_fail, reports, report_json_list)
+        # Remove the TGA screenshots from the working directory. Only the indexed files are deleted, without listing the folder.
+        frame_buffer.remove_frames(work_dir)
+        # Private working directories of parallel simulations are not needed anymore
+        if work_dir != os.getcwd():
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return (log_success_fail, reports, report_json_list, vision_requests)
+
+# Simulates the scenarios in a pool of supervised processes, each scenario in a private working directory.
+# Returns the results in the same order as the scenarios.
+def run_simulations_parallel(scenarios, captureInterval, parallel_workers, headless=False, online_specs=None, csv_log=False, time_budgets=(None, None), controller_source=None):
+    # Relative paths are resolved before the workers change their working directory
+    bin_folder = os.path.abspath(ESMINI_BIN_FOLDER)
+    if controller_source is None:
+        controller_source = controller_loader.read_controller()
+
+    if online_specs is None:
+        online_specs = [None] * len(scenarios)
+
+    work_dirs = []
+    args_list = []
+    for scenario, specs in zip(scenarios, online_specs):
+        work_dir = tempfile.mkdtemp(prefix="svala_")
+        work_dirs.append(work_dir)
+        scenario_file = os.path.abspath(SCENARIO_FOLDER + scenario)
+        args_list.append((scenario_file, captureInterval, work_dir, bin_folder, controller_source, headless, None, specs, csv_log))
+
+    # Workers which exceed a time budget are killed and replaced, the results of their scenarios are timeouts
+    (step_budget, scenario_budget) = time_budgets
+    results = supervisor.Supervisor(parallel_workers, step_budget, scenario_budget).run(run_simulation_in_folder, args_list)
+    return [(run_result, message, work_dir, online_report) for (run_result, message, online_report), work_dir in zip(results, work_dirs)]
+
+# Runs one simulation in the current directory, evaluating the checks given by online_specs during the simulation
+def run_simulation_in_current_folder(scenario, captureInterval, headless=False, online_specs=None, csv_log=False, controller_source=None):
+    online_report = report_gen_online.OnlineReport(online_specs) if online_specs is not None else None
+    (run_result, message) = run_simulation(SCENARIO_FOLDER + scenario, captureInterval, headless=headless, online_report=online_report, csv_log=csv_log, controller_source=controller_source)
+    return (run_result, message, os.getcwd(), online_report)
+
+# Entry point of a worker process. Runs one simulation with the given folder as working directory, 
+# so that the logs and the screenshots of concurrent simulations do not overwrite each other.
+def run_simulation_in_folder(scenario, captureInterval, work_dir, bin_folder, controller_source, headless=False, capture_steps=None, online_specs=None, csv_log=False):
+    os.chdir(work_dir)
+    # On Windows the CSV log path points into a subfolder which has to exist
+    os.makedirs("recordings", exist_ok=True)
+    online_report = report_gen_online.OnlineReport(online_specs) if online_specs is not None else None
+    (run_result, message) = run_simulation(scenario, captureInterval, bin_folder, headless, capture_steps, online_report, csv_log, controller_source)
+    return (run_result, message, online_report)
+
+# Simulates a scenario again with rendering, saving only the frames around the crash step (one screenshot before and after). 
+# The screenshots and their index are written to work_dir.
+def replay_crash_frames(scenario, captureInterval, crash_step, work_dir, controller_source=None):
+    capture_steps = [step for step in (crash_step - captureInterval, crash_step, crash_step + captureInterval) if step > 0]
+
+    if work_dir == os.getcwd():
+        run_simulation(SCENARIO_FOLDER + scenario, captureInterval, capture_steps=capture_steps, controller_source=controller_source)
+    else:
+        # The replay has to run with the private working directory of the scenario, which is only changed in a separate process
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            executor.submit(run_simulation_in_folder, os.path.abspath(SCENARIO_FOLDER + scenario), captureInterval, work_dir, 
+                os.path.abspath(ESMINI_BIN_FOLDER), controller_source or controller_loader.read_controller(), False, capture_steps).result()
 
-# Initializes an instance of Esmini and test the controller with the provided scenario
-def run_simulation(scenario, captureInterval):
+# Initializes an instance of Esmini and test the controller with the provided scenario.
+# Headless simulations open no window and save no screenshots. 
+# If capture_steps is given, screenshots are only saved at those steps and the simulation ends after the last one.
+# If an online report is given, it observes every step and the simulation ends shortly after the verdicts of all its checks are fixed.
+# Every step is recorded to the trajectory log, except in replays for screenshots. Esmini only writes a CSV log if csv_log is set.
+def run_simulation(scenario, captureInterval, bin_folder=ESMINI_BIN_FOLDER, headless=False, capture_steps=None, online_report=None, csv_log=False, controller_source=None):
+
+    # Reference to esmini shared library via ctypes, loaded once per process
+    se = esmini_binding.load_library(bin_folder)
 
-    # Reference to esmini shared library via ctypes
-    if sys.platform == "linux" or sys.platform == "linux2":
-        se = ct.CDLL("../bin/libesminiLib.so")
-    elif sys.platform == "darwin":
-        se = ct.CDLL("../bin/libesminiLib.dylib")
-    elif sys.platform == "win32":
-        se = ct.CDLL("../bin/esminiLib.dll")
-    else:
-        print("Unsupported platform: {}".format(sys.platform))
-        quit()
-
-    # specify arguments and return types of useful functions
-    se.SE_StepDT.argtypes = [ct.c_float]
-    se.SE_GetSimulationTime.restype = ct.c_float
-    se.SE_InjectedActionOngoing.restype = ct.c_bool
-
-    # Prepare arguments for initializing Esmin
-    se.SE_InitWithArgs.argtypes = [ct.c_int, ct.POINTER(ct.c_char_p)]    
-    args = [
-        '--window', '80', '80', '1200', '800', 
-        # '--headless',
-        '--osc', scenario, 
-        '--csv_logger', 'recordings\\full_log.csv', 
-        '--collision', 
-        '--disable_stdout', 
-        '--trail_mode', '3', 
-        '--info_text', '2', 
-        '--custom_camera', '-70,40,50,-0.5,0.6',
-        '--text_scale', '2.0'
-        ]
-    argc = len(args)
-    argv = (ct.c_char_p * argc)(*map(lambda arg: arg.encode('utf-8'), args))
-    
     # initialize Esmini
-    se.SE_InitWithArgs(ct.c_int(argc), argv)
+    esmini_binding.init(se, esmini_arguments(scenario, headless, csv_log))
     
     # initialize and update the state object
     state = state_layer.State(se)
     state.update()
-
-    import custom_controller
-    # Reload is necessary to obtain new version when controller file is updated
-    importlib.reload(custom_controller)
+    recorder = trajectory_log.TrajectoryRecorder(state) if capture_steps is None else None
+    profiler = step_profiler.StepProfiler(0.1) if capture_steps is None else None
+    # What the controller prints is captured instead of written to the console
+    output = controller_output.ControllerOutput()
+    # The screenshots saved by Esmini, by step
+    frames = frame_buffer.FrameBuffer() if not headless or capture_steps is not None else None
+
+    # Without a given source the controller file in the current directory is used
+    if controller_source is None:
+        controller_source = controller_loader.read_controller()
     
     # A try-except block is used as the controller code is not guaranteed to be syntactically correct.  
     try: 
-        # Load the custom_controller file and initailize a controller
-        controller = custom_controller.CustomController(state)
+        # Load the controller as a new module, compiled once per version, and initailize a controller
+        console = sys.stdout
+        sys.stdout = output
+        try:
+            custom_controller = controller_loader.load_controller(controller_source)
+            controller = custom_controller.CustomController(state)
+        finally:
+            sys.stdout = console
         
         step = 0
+        # Simulation time when the simulation is ended because the verdicts of the online checks are fixed 
+        end_time = None
 
         # Simulation loop
-        while se.SE_GetQuitFlag() == 0 and se.SE_GetSimulationTime() < 30.0:
-            
-            # Updates the values stored in the state object each time step
-            state.update()
+        while se.SE_GetQuitFlag() == 0:
+            simulation_time = se.SE_GetSimulationTime()
+            if simulation_time >= 30.0:
+                break
+
+            if recorder is not None:
+                recorder.record(simulation_time)
+
+            if online_report is not None:
+                online_report.observe(state, simulation_time)
+                # One more second is simulated, so that the frames around a collision are logged and captured
+                if end_time is None and online_report.finished:
+                    end_time = simulation_time + 1.0
+                if end_time is not None and simulation_time >= end_time:
+                    online_report.stopped_early = True
+                    break
 
             # Counter of steps for screenshots 
             step += 1
-
-            # Saves an image every captureInterval frames
-            if step % captureInterval == 0:
+            capture_start = time.perf_counter()
+
+            # Saves an image every captureInterval frames, or at the requested steps only
+            if capture_steps is not None:
+                if step in capture_steps:
+                    se.SE_SaveImagesToFile(1)
+                    frames.captured(step)
+                elif step > capture_steps[-1]:
+                    break
+            elif not headless and step % captureInterval == 0:
                 se.SE_SaveImagesToFile(1)
+                frames.captured(step)
+
+            # Let the controller take action, only the actions that change something are injected
+            controller_start = time.perf_counter()
+            output.step = step
+            sys.stdout = output
+            supervisor.step_started()
+            try:
+                controller.step()
+            finally:
+                sys.stdout = console
+            supervisor.step_finished()
+            state.flush()
+
+            # Steps the simulation by a constant value and updates the values stored in the state object.
+            # Same as esmini_binding.step_and_fetch, with the two parts timed separately.
+            simulator_step_start = time.perf_counter()
+            se.SE_StepDT(0.1)
+            update_start = time.perf_counter()
+            state.update()
+            if profiler is not None:
+                profiler.add(time.perf_counter() - update_start, simulator_step_start - controller_start, controller_start - capture_start, update_start - simulator_step_start)
 
-            # Let the controller take action
-            controller.step()
-
-            # Steps the simulation by a constant value
-            se.SE_StepDT(0.1) 
+        if profiler is not None:
+            profiler.stop()
 
         # Assume that Esmini did not launch correctly if there were fewer than 25 steps.
-        if step < 24:
+        if step < 24 and end_time is None:
             return ("error", RuntimeError("Esmini closed earlier than expected"))
         return ("success", "")
     except Exception as e:
             # Return error and the associated message if there's a runtime error when trying to run the controller file
-            return ("error", e)
+            return ("error", controller_loader.portable_exception(e))
+    finally:
+        # The steps simulated before an error are saved as well
+        if recorder is not None:
+            recorder.save(trajectory_log.TRAJECTORY_PATH)
+        if profiler is not None:
+            # The actions of the steps simulated before an error are counted as well
+            profiler.count_actions(state.injected_actions, state.suppressed_actions)
+            profiler.save(step_profiler.PROFILE_PATH)
+            output.save(controller_output.OUTPUT_PATH)
+        if frames is not None:
+            frames.save(frame_buffer.INDEX_PATH)
     
+# The command line arguments Esmini is initialized with
+def esmini_arguments(scenario, headless=False, csv_log=False):
+    return [
+        *(['--headless'] if headless else ['--window', '80', '80', '1200', '800']), 
+        '--osc', scenario, 
+        *(['--csv_logger', CSV_LOG_PATH] if csv_log else []), 
+        '--collision', 
+        '--disable_stdout', 
+        '--trail_mode', '3', 
+        '--info_text', '2', 
+        '--custom_camera', '-70,40,50,-0.5,0.6',
+        '--text_scale', '2.0'
+        ]
+
 # Takes the list of reports and combined them into a string with new line characters  
 def format_reports(iteration, reports):
     log_string = f"Iteration {iteration} reports:\n"
@@ -257,40 +625,64 @@ def format_reports(iteration, reports):
     return log_string
 
 # Creates a JSON object and populates the first iteraton
-def create_evaluation_json(evaluation_suite, log_success_fail, report_json_list):
+def create_evaluation_json(evaluation_suite, log_success_fail, report_json_list, candidates=None, controller_path="custom_controller.py"):
     evaluation_data = {
         "task": evaluation_suite['task'], 
         "requirement_specification": evaluation_suite['requirement_specification'],
         "create_new_controller": ['create_new_controller'],
         "use_vision_api": evaluation_suite['use_vision_api'],
         "number_of_iterations": evaluation_suite['number_of_iterations'],
-        "iterations": [create_iteration_json(0, log_success_fail, report_json_list)
+        "iterations": [create_iteration_json(0, log_success_fail, report_json_list, candidates, controller_path)
         ]
     }
     return evaluation_data 
 
 # Creates an iteration entry for the JSON
-def create_iteration_json(iteration, log_success_fail, report_json_list):
+def create_iteration_json(iteration, log_success_fail, report_json_list, candidates=None, controller_path="custom_controller.py"):
     iteration_data = {
         "iteration": iteration,
-        "static": report_gen_static.static_analysis_json("custom_controller.py"),
+        "static": report_gen_static.static_analysis_json(controller_path),
         "run_success": log_success_fail['success'],
         "run_fail": log_success_fail['fail'],
         "run_error": log_success_fail['error'],
+        "run_timeout": log_success_fail['timeout'],
+        "step_profile": summarize_profiles(report_json_list),
+        "candidates": candidates,
         "scenario_checks": report_json_list
     }
     return iteration_data  
 
-# Creates a copy of the CSV log file and places is in the run folder
-def copy_csv_log(run_path, iteration, scenario):
+# The slowest values over the simulated scenarios of the iteration. The profile of each scenario is in its scenario_checks entry.
+def summarize_profiles(report_json_list):
+    profiles = [report_json["profile"] for report_json in report_json_list if report_json.get("profile")]
+    if not profiles:
+        return None
+    return {
+        "scenarios": len(profiles),
+        "min_real_time_factor": min((profile["real_time_factor"] for profile in profiles if profile["real_time_factor"] is not None), default=None),
+        "controller_deadline_misses": sum(profile["controller_deadline_misses"] for profile in profiles),
+        "actions_injected": sum(sum(profile["actions"]["injected"].values()) for profile in profiles),
+        "actions_suppressed": sum(sum(profile["actions"]["suppressed"].values()) for profile in profiles),
+        **{f"{phase}_max_p99_ms": max(profile[phase]["p99_ms"] or 0 for profile in profiles) for phase in step_profiler.PHASES}
+    }
+
+# The log files of a simulation that ran in the given folder: the trajectory log with its header and the CSV log if Esmini wrote one
+def simulation_logs(folder):
+    trajectory_path = os.path.join(folder, trajectory_log.TRAJECTORY_PATH)
+    log_paths = [trajectory_path, trajectory_log.header_path(trajectory_path), os.path.join(folder, CSV_LOG_PATH)]
+    return [path for path in log_paths if os.path.exists(path)]
+
+# Creates a copy of the log files and places them in the run folder
+def copy_logs(run_path, iteration, scenario, log_paths):
     destination_folder = os.path.join(run_path, str(iteration), scenario)
-    destination_path = os.path.join(destination_folder, 'full_log.csv')
     os.makedirs(destination_folder, exist_ok=True)
-    csv_path = 'recordings\\full_log.csv'
-    try:
-        shutil.copy(csv_path, destination_path)  # Copy the file to the destination path
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    for log_path in log_paths:
+        # The CSV log keeps its name, since on other platforms than Windows Esmini writes it as "recordings\full_log.csv" in the working directory
+        destination_path = os.path.join(destination_folder, 'full_log.csv' if log_path.endswith('full_log.csv') else os.path.basename(log_path))
+        try:
+            shutil.copy(log_path, destination_path)  # Copy the file to the destination path
+        except Exception as e:
+            print(f"An error occurred: {e}")
 
 # Saves the JSON file
 def save_evaluation_data(data, run_path):
@@ -313,8 +705,15 @@ def create_run_folder(custom_str):
     folder_name = f"{date_time_str}_{custom_str}"
     new_folder_path = os.path.join(runs_folder_path, folder_name)
     
-    # Create the new folder
-    os.makedirs(new_folder_path)
+    # Create the new folder. Runs started in the same second, e.g. in a batch, get a number appended.
+    number = 1
+    while True:
+        try:
+            os.makedirs(new_folder_path)
+            break
+        except FileExistsError:
+            number += 1
+            new_folder_path = os.path.join(runs_folder_path, f"{folder_name}_{number}")
     
     return new_folder_path
 
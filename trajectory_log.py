@@ -0,0 +1,103 @@
+import json
+import os
+import numpy as np
+
+import state_layer
+
+"""Binary trajectory logs recorded from the State during the simulation.
+A log is a .npy file with one record per simulation step, holding the time, the vehicle Ego is colliding with
+and the recorded fields of the states of all vehicles, together with a JSON header with the names of the vehicles.
+The .npy file is memory mapped when read, so only the parts the checks use are loaded."""
+
+# The trajectory log of a simulation, relative to its working directory
+TRAJECTORY_PATH = os.path.join("recordings", "trajectory.npy")
+
+# Initial capacity of a recording in steps, enough for a 30 s scenario with 0.1 s steps
+INITIAL_STEPS = 320
+
+# Esmini writes the CSV log with three decimals, the columns built from a trajectory are rounded the same way
+DECIMALS = 3
+
+# Fields of SE_ScenarioObjectState which are recorded for each vehicle
+RECORDED_FIELDS = ["id", "x", "y", "z", "h", "s", "t", "laneId", "laneOffset", "speed"]
+VEHICLE_DTYPE = np.dtype([(field, state_layer.VEHICLE_STATE_DTYPE.fields[field][0]) for field in RECORDED_FIELDS])
+
+# CSV columns of each vehicle which have a field in the vehicle states
+VEHICLE_FIELDS = {
+    "Current_Speed [m/s]": "speed",
+    "World_Position_X [m]": "x",
+    "World_Position_Y [m]": "y",
+    "Distance_Travelled_Along_Road_Segment [m]": "s",
+    "Lateral_Distance_Lanem [m]": "t",
+    "lane_id": "laneId",
+}
+
+
+def step_dtype(number_of_vehicles):
+    return np.dtype([
+        ("time", "f8"),
+        ("ego_collision", "i4"),  # Id of the vehicle Ego collides with, -1 if none
+        ("vehicles", VEHICLE_DTYPE, (number_of_vehicles,)),
+    ])
+
+def header_path(trajectory_path):
+    return os.path.splitext(trajectory_path)[0] + ".json"
+
+
+class TrajectoryRecorder:
+    def __init__(self, state):
+        self.state = state
+        self.steps = np.zeros(INITIAL_STEPS, dtype=step_dtype(len(state.vehicle_states)))
+        self.number_of_steps = 0
+        self.vehicle_ids = list(state.vehicle_structs)
+        self.vehicle_names = [state.get_name(vehicle_id) for vehicle_id in self.vehicle_ids]
+
+    # Copies the current state into the next record. Called once per simulation step, after the state is updated.
+    def record(self, time):
+        if self.number_of_steps == len(self.steps):
+            self.steps = np.concatenate([self.steps, np.zeros_like(self.steps)])
+        collisions = self.state.get_collisions(0)
+        self.steps["time"][self.number_of_steps] = round(time, DECIMALS)
+        self.steps["ego_collision"][self.number_of_steps] = collisions[0] if collisions else -1
+        # Structured arrays are assigned field by field in order, the recorded fields have the same order in both
+        self.steps["vehicles"][self.number_of_steps] = self.state.vehicle_states[RECORDED_FIELDS]
+        self.number_of_steps += 1
+
+    def save(self, trajectory_path=TRAJECTORY_PATH):
+        os.makedirs(os.path.dirname(trajectory_path) or ".", exist_ok=True)
+        np.save(trajectory_path, self.steps[:self.number_of_steps])
+        with open(header_path(trajectory_path), "w") as file:
+            json.dump({"vehicle_ids": self.vehicle_ids, "vehicle_names": self.vehicle_names}, file)
+
+
+# Returns the memory mapped records and the header of a trajectory log
+def read_trajectory(trajectory_path):
+    steps = np.load(trajectory_path, mmap_mode="r")
+    with open(header_path(trajectory_path)) as file:
+        header = json.load(file)
+    return steps, header
+
+# The names of all columns that can be built from a trajectory, in the form of the CSV log
+def trajectory_columns(header):
+    columns = ["Index [-]", "TimeStamp [s]", "#1 collision_ids"]
+    for number in range(1, len(header["vehicle_ids"]) + 1):
+        columns.append(f"#{number} Entity_Name [-]")
+        columns.extend(f"#{number} {name}" for name in VEHICLE_FIELDS)
+    return columns
+
+# Builds a column of the CSV log from the records. Vehicle numbers start from 1 for Ego, like in the CSV log.
+def trajectory_column(steps, header, column):
+    if column == "Index [-]":
+        return np.arange(len(steps))
+    if column == "TimeStamp [s]":
+        return np.asarray(steps["time"])
+    if column == "#1 collision_ids":
+        return np.array(["" if vehicle_id < 0 else str(vehicle_id) for vehicle_id in steps["ego_collision"]], dtype=object)
+
+    prefix, name = column.split(" ", 1)
+    vehicle_index = int(prefix[1:]) - 1
+    if name == "Entity_Name [-]":
+        return np.full(len(steps), header["vehicle_names"][vehicle_index], dtype=object)
+    # Numbers are given as floats, like load_log reads them from the CSV log
+    values = steps["vehicles"][VEHICLE_FIELDS[name]][:, vehicle_index]
+    return np.round(values.astype("float64"), DECIMALS)